@@ -0,0 +1,108 @@
+from collections import Counter
+from models import COLLECTIONS, MEMBER_FIELDS, SCORE_WEIGHTS
+
+# Key under which totals across every team are kept
+ALL_TEAMS = None
+
+
+def _copy_bucket(bucket):
+    return {
+        'time': dict(bucket['time']),
+        'count': dict(bucket['count']),
+        'status': {name: Counter(counts) for name, counts in bucket['status'].items()},
+        'critical': bucket['critical'],
+        'score_points': bucket['score_points']
+    }
+
+
+def _empty_bucket():
+    return {
+        'time': {name: 0 for name in COLLECTIONS},
+        'count': {name: 0 for name in COLLECTIONS},
+        'status': {name: Counter() for name in COLLECTIONS},
+        'critical': 0,
+        'score_points': 0
+    }
+
+
+def _count(teams, members, collection, record, sign):
+    """Add (sign=1) or remove (sign=-1) a record in the team and member buckets"""
+    team = record.get('team')
+    scopes = (ALL_TEAMS,) if team is ALL_TEAMS else (team, ALL_TEAMS)
+    member = record.get(MEMBER_FIELDS[collection])
+    time_spent = record['time_spent'] * sign
+    status = record.get('status')
+    critical = sign if collection == 'prod_issues' and record.get('severity') == 'Critical' else 0
+    points = SCORE_WEIGHTS.get((collection, status), 0) * sign
+
+    buckets = []
+    for scope in scopes:
+        if scope not in teams:
+            teams[scope] = _empty_bucket()
+        buckets.append(teams[scope])
+        if member is not None:
+            key = (scope, member)
+            if key not in members:
+                members[key] = _empty_bucket()
+            buckets.append(members[key])
+
+    for bucket in buckets:
+        bucket['time'][collection] += time_spent
+        bucket['count'][collection] += sign
+        bucket['status'][collection][status] += sign
+        bucket['critical'] += critical
+        bucket['score_points'] += points
+
+
+class Aggregates:
+    """Materialized counters per team, per member and per category.
+
+    Buckets are kept for every team and for ALL_TEAMS, and for every
+    (team, member) pair including (ALL_TEAMS, member). A single record change
+    adjusts a fixed number of counters, so metrics never rescan the snapshot.
+    """
+
+    def __init__(self):
+        self.teams = {ALL_TEAMS: _empty_bucket()}
+        self.members = {}
+
+    def update(self, store, change=None):
+        """SnapshotStore listener: rebuild on publish, adjust on record changes"""
+        if change is None:
+            retention = getattr(store, 'retention', None)
+            self.rebuild(store.data, retention.aggregates if retention else None)
+            return
+        if change['old'] is not None:
+            self._apply(change['collection'], change['old'], -1)
+        if change['new'] is not None:
+            self._apply(change['collection'], change['new'], 1)
+
+    def rebuild(self, data, base=None):
+        """Recount `data` on top of `base`, the aggregates of records compacted out of it.
+
+        The new buckets are built aside and swapped in once complete, so
+        concurrent readers see either the old totals or the new ones.
+        """
+        teams = {ALL_TEAMS: _empty_bucket()}
+        members = {}
+        if base is not None:
+            teams.update((team, _copy_bucket(bucket)) for team, bucket in base.teams.items())
+            members = {key: _copy_bucket(bucket) for key, bucket in base.members.items()}
+        for name in COLLECTIONS:
+            for record in data[name]:
+                _count(teams, members, name, record, 1)
+        self.teams, self.members = teams, members
+
+    def _apply(self, collection, record, sign):
+        _count(self.teams, self.members, collection, record, sign)
+
+    def team(self, team=ALL_TEAMS):
+        """Bucket for a team (ALL_TEAMS for everything); empty if unknown"""
+        return self.teams.get(team) or _empty_bucket()
+
+    def member(self, member, team=ALL_TEAMS):
+        """Bucket for a member within a team; empty if unknown"""
+        return self.members.get((team, member)) or _empty_bucket()
+
+
+aggregates = Aggregates()
@@ -0,0 +1,191 @@
+import threading
+from datetime import date, timedelta
+import numpy as np
+from aggregates import ALL_TEAMS
+from config import config
+from models import COLLECTIONS, DATE_FIELDS, TREND_CATEGORIES
+
+# Trend categories in array order, with the titles used in insights
+CATEGORIES = ['development', 'testing', 'prod_support', 'prod_issues']
+CATEGORY_TITLES = {
+    'development': 'Development',
+    'testing': 'Testing',
+    'prod_support': 'Prod Support',
+    'prod_issues': 'Prod Issue'
+}
+
+# Floor (hours) for a baseline's standard deviation, so a spike after idle days gets a finite z-score
+MIN_STD = 1.0
+
+
+class AnomalyDetector:
+    """Spikes in the per-team daily hours behind /api/trends.
+
+    Hours live in one array of shape (teams, days, categories) covering the
+    last `history_days` days. A record change adjusts its cells and a new day
+    shifts the array, so only a snapshot publish rescans the records.
+    Scoring is vectorized over every team and category at once: each day is
+    compared with the mean and standard deviation of the `window` days before
+    it (rolling sums from cumulative sums) and with the EWMA up to the day
+    before. Days among the last `recent_days` whose z-score reaches
+    `z_threshold` and that exceed the EWMA become insights.
+    """
+
+    def __init__(self, history_days=None, window=None, z_threshold=None, alpha=None, recent_days=None, min_hours=None):
+        self.history_days = history_days or config.ANOMALY_HISTORY_DAYS
+        self.window = window or config.ANOMALY_WINDOW
+        self.z_threshold = z_threshold or config.ANOMALY_Z_THRESHOLD
+        self.alpha = alpha or config.ANOMALY_EWMA_ALPHA
+        self.recent_days = recent_days or config.ANOMALY_RECENT_DAYS
+        self.min_hours = config.ANOMALY_MIN_HOURS if min_hours is None else min_hours
+        self.weights = self._ewma_weights()
+        self.teams = []
+        self.rows = {}
+        self.series = np.zeros((0, self.history_days, len(CATEGORIES)))
+        self.end = None
+        self.results = {}
+        self.scored_at = None
+        self._dirty = True
+        self._lock = threading.Lock()
+
+    def _ewma_weights(self):
+        """(days, days) matrix W with EWMA = W @ series: row t weights days 0..t, seeded by day 0"""
+        days = np.arange(self.history_days)
+        age = days[:, None] - days[None, :]
+        weights = np.where(age >= 0, self.alpha * (1 - self.alpha) ** np.maximum(age, 0), 0.0)
+        weights[:, 0] = (1 - self.alpha) ** days
+        return weights
+
+    def update(self, store, change=None):
+        """SnapshotStore listener: rebuild on publish, adjust the changed record's cells otherwise"""
+        with self._lock:
+            if change is None:
+                self.rebuild(store.data, getattr(store, 'retention', None))
+                return
+            self._advance(date.today())
+            if change['old'] is not None:
+                self._add(change['collection'], change['old'], -1)
+            if change['new'] is not None:
+                self._add(change['collection'], change['new'], 1)
+            self._dirty = True
+
+    def rebuild(self, data, retention=None):
+        self.teams = []
+        self.rows = {}
+        self.series = np.zeros((0, self.history_days, len(CATEGORIES)))
+        self.end = date.today()
+        self._row(ALL_TEAMS)
+        for name in COLLECTIONS:
+            for record in data[name]:
+                self._add(name, record, 1)
+            if retention:
+                for team in retention.daily:
+                    for day, hours in retention.daily_time(name, team).items():
+                        self._add_hours(team, name, day, hours)
+        self._dirty = True
+
+    def _row(self, team):
+        if team not in self.rows:
+            self.rows[team] = len(self.teams)
+            self.teams.append(team)
+            self.series = np.concatenate([self.series, np.zeros((1,) + self.series.shape[1:])])
+        return self.rows[team]
+
+    def _advance(self, today):
+        """Shift the series so that its last day is today"""
+        shift = (today - self.end).days
+        if shift <= 0:
+            return
+        if shift >= self.history_days:
+            self.series[:] = 0
+        else:
+            self.series[:, :-shift] = self.series[:, shift:]
+            self.series[:, -shift:] = 0
+        self.end = today
+        self._dirty = True
+
+    def _column(self, day):
+        try:
+            offset = (self.end - date.fromisoformat(day)).days
+        except (TypeError, ValueError):
+            return None
+        column = self.history_days - 1 - offset
+        return column if 0 <= column < self.history_days else None
+
+    def _add_hours(self, team, collection, day, hours):
+        column = self._column(day)
+        if column is None:
+            return
+        category, divisor = TREND_CATEGORIES[collection]
+        row = self._row(team)
+        self.series[row, column, CATEGORIES.index(category)] += hours / divisor
+
+    def _add(self, collection, record, sign):
+        for team in {record.get('team'), ALL_TEAMS}:
+            self._add_hours(team, collection, record.get(DATE_FIELDS[collection]), record['time_spent'] * sign)
+
+    def score(self):
+        """Recompute anomalies for every team and category"""
+        x = self.series
+        w = self.window
+        zeros = np.zeros_like(x[:, :1])
+        sums = np.concatenate([zeros, np.cumsum(x, axis=1)], axis=1)
+        squares = np.concatenate([zeros, np.cumsum(x ** 2, axis=1)], axis=1)
+
+        # Baseline of day t is days t-w .. t-1, so scoring starts at day w
+        mean = (sums[:, w:-1] - sums[:, :-w - 1]) / w
+        variance = (squares[:, w:-1] - squares[:, :-w - 1]) / w - mean ** 2
+        std = np.maximum(np.sqrt(np.clip(variance, 0, None)), MIN_STD)
+        current = x[:, w:]
+        z = (current - mean) / std
+        ewma = np.matmul(self.weights, x)[:, w - 1:-1]
+
+        recent = np.arange(current.shape[1]) >= current.shape[1] - self.recent_days
+        flagged = (z >= self.z_threshold) & (current >= self.min_hours) & (current > ewma) & recent[None, :, None]
+
+        results = {team: [] for team in self.teams}
+        for row, category in zip(*np.nonzero(flagged.any(axis=1))):
+            # Report the strongest recent spike of each team and category
+            scores = np.where(flagged[row, :, category], z[row, :, category], -np.inf)
+            t = int(np.argmax(scores))
+            day = self.end - timedelta(days=current.shape[1] - 1 - t)
+            results[self.teams[row]].append(self._insight(
+                CATEGORIES[category], day, current[row, t, category], mean[row, t, category],
+                ewma[row, t, category], z[row, t, category]
+            ))
+        for insights in results.values():
+            insights.sort(key=lambda insight: -insight['value'])
+        self.results = results
+        self.scored_at = date.today().isoformat()
+        self._dirty = False
+
+    def _insight(self, category, day, value, mean, ewma, z):
+        title = CATEGORY_TITLES[category]
+        usual = f'{value / mean:.1f}x the {self.window}-day average of {mean:.1f}h' if mean > 0 else f'after {self.window} days without any'
+        return {
+            'type': 'critical' if z >= 2 * self.z_threshold else 'warning',
+            'title': f'{title} Spike',
+            'message': f'{title} hours on {day.isoformat()} were {value:.1f}h, {usual} (z-score {z:.1f}, trend {ewma:.1f}h).',
+            'value': round(float(z), 1)
+        }
+
+    def get(self, team=ALL_TEAMS):
+        """Anomaly insights for a team, rescored if the data or the day changed"""
+        with self._lock:
+            if self.end is None:
+                return []
+            self._advance(date.today())
+            if self._dirty:
+                self.score()
+            return list(self.results.get(team, []))
+
+    def status(self):
+        return {
+            'teams': len(self.teams),
+            'days': self.history_days,
+            'scored_at': self.scored_at,
+            'anomalies': sum(len(insights) for insights in self.results.values())
+        }
+
+
+anomaly_detector = AnomalyDetector()
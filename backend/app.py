@@ -1,12 +1,33 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, HTTPException, Body, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, PlainTextResponse, StreamingResponse
 from datetime import datetime, timedelta
 import json
-from models import generate_fake_data, get_productivity_metrics, get_time_distribution, get_team_performance
-from typing import Optional
+import hmac
+import asyncio
+from models import COLLECTIONS, generate_fake_data, get_productivity_metrics, get_time_distribution, get_team_performance, get_trends
+from typing import List, Optional
 from config import config
+from snapshot import store
+from shared_snapshot import SharedSnapshot
+from webhooks import jira_event_changes, gitlab_event_changes
+from aggregates import aggregates
+from insights import insight_engine, team_insights
+from anomalies import anomaly_detector
+from streaming import broadcaster
+from indexes import query_index
+from percentiles import percentile_index
+from leaderboard import leaderboard, LEADERBOARD_METRICS
+from history import history_store
+from ci_activity import ci_activity
+from http_transport import http_transport
+from ingestion import ingestion
+from circuit import breakers
+from warmup import warmup
+from profiling import ProfilingMiddleware, ProfilingRoute, profile_store, sampling_profiler
 
 app = FastAPI(title="Progress Tracker API", version="1.0.0")
+app.router.route_class = ProfilingRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,14 +35,92 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id"],
 )
+app.add_middleware(ProfilingMiddleware, store=profile_store)
 
-data = generate_fake_data()
+@app.on_event('startup')
+def start_sampling_profiler():
+    if config.PROFILE_SAMPLING:
+        sampling_profiler.start()
+
+@app.on_event('shutdown')
+def stop_sampling_profiler():
+    sampling_profiler.stop()
+
+store.subscribe(aggregates.update)
+store.subscribe(query_index.update)
+store.subscribe(percentile_index.update)
+store.subscribe(leaderboard.update)
+store.subscribe(insight_engine.rebuild)
+store.subscribe(anomaly_detector.update)
+store.subscribe(broadcaster.on_change)
+if history_store:
+    store.subscribe(history_store.listener)
+
+# Days of /api/trends that are precomputed; other ranges are computed per request
+TRENDS_DAYS = 30
+
+warmup.register('overview', lambda team: get_productivity_metrics(aggregates, team))
+warmup.register('team_performance', lambda team: get_team_performance(aggregates, team))
+warmup.register('insights', lambda team: {'insights': team_insights(team)})
+warmup.register('trends', lambda team: get_trends(store.data, TRENDS_DAYS, team, store.retention))
+store.subscribe(warmup.listener)
+
+if config.SHARED_SNAPSHOT_DIR:
+    # One worker builds the snapshot; all workers map it from disk
+    shared_snapshot = SharedSnapshot(config.SHARED_SNAPSHOT_DIR, store, generate_fake_data)
+    # Only the leader polls GitLab for pipelines and commits, and writes history
+    ci_activity.share(shared_snapshot)
+    if history_store:
+        history_store.share(shared_snapshot)
+else:
+    shared_snapshot = None
+    store.publish(generate_fake_data())
+
+@app.on_event('startup')
+async def attach_broadcaster():
+    broadcaster.attach(asyncio.get_running_loop())
+
+@app.on_event('startup')
+def start_shared_snapshot():
+    if shared_snapshot:
+        shared_snapshot.start()
+
+@app.on_event('shutdown')
+def stop_shared_snapshot():
+    if shared_snapshot:
+        shared_snapshot.stop()
+
+@app.on_event('startup')
+def start_retention():
+    if store.retention:
+        store.retention.start(store)
+
+@app.on_event('shutdown')
+def stop_retention():
+    if store.retention:
+        store.retention.stop()
+
+@app.on_event('startup')
+def start_ci_activity():
+    ci_activity.start()
+
+@app.on_event('shutdown')
+def stop_ci_activity():
+    ci_activity.stop()
 
 @app.get('/api/overview')
 def get_overview(team: Optional[str] = Query(None)):
     """Get overall productivity overview"""
-    return get_productivity_metrics(data, team)
+    return warmup.get('overview', team)
+
+@app.get('/api/ready')
+def get_readiness():
+    """Readiness probe: 503 until the first snapshot's responses are warmed"""
+    if not warmup.ready.is_set():
+        raise HTTPException(status_code=503, detail='Warming up')
+    return {'ready': True, 'warmup': warmup.last_run}
 
 @app.get('/api/status')
 def get_api_status():
@@ -35,26 +134,54 @@ def get_api_status():
         'jira_enabled': jira_integration.enabled,
         'gitlab_enabled': gitlab_integration.enabled,
         'confluence_enabled': confluence_integration.enabled,
-        'teams': config.TEAMS
+        'teams': config.TEAMS,
+        'snapshot': {
+            'version': store.version,
+            'updated_at': store.updated_at,
+            'shared': shared_snapshot.status() if shared_snapshot else None
+        },
+        'retention': store.retention.status() if store.retention else None,
+        'history': history_store.status() if history_store else None,
+        'ci_activity': ci_activity.status(),
+        'anomalies': anomaly_detector.status(),
+        'warmup': warmup.status(),
+        'http': http_transport.status(),
+        'sources': {name: breaker.status() for name, breaker in breakers.items()},
+        'ingestion': {key: value for key, value in ingestion.status().items() if key != 'shards'}
     }
 
+@app.get('/api/ingestion')
+def get_ingestion_progress():
+    """Per-shard ingestion progress: state, duration, record count and last error"""
+    return ingestion.status()
+
 @app.get('/api/time-distribution')
 def get_time_dist(
     period: str = Query('week'),
     team: Optional[str] = Query(None)
 ):
     """Get time distribution across different activities"""
-    return get_time_distribution(data, period, team)
+    return get_time_distribution(aggregates, period, team)
 
 @app.get('/api/team-performance')
 def get_team_perf(team: Optional[str] = Query(None)):
     """Get team member performance metrics"""
-    return get_team_performance(data, team)
+    return warmup.get('team_performance', team)
+
+@app.get('/api/leaderboard')
+def get_leaderboard(
+    metric: str = Query('productivity_score', pattern=f'^({"|".join(LEADERBOARD_METRICS)})$'),
+    team: Optional[str] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=500)
+):
+    """Members ranked by a metric, highest first, one page at a time; omit team for all teams"""
+    return leaderboard.top(metric, team or None, offset, limit)
 
 @app.get('/api/user-stories')
 def get_user_stories(team: Optional[str] = Query(None)):
     """Get all user stories with status"""
-    stories = data['user_stories']
+    stories = list(store.data['user_stories'])
     if team:
         stories = [s for s in stories if s.get('team') == team]
     return {
@@ -67,7 +194,7 @@ def get_user_stories(team: Optional[str] = Query(None)):
 @app.get('/api/pull-requests')
 def get_pull_requests(team: Optional[str] = Query(None)):
     """Get all pull requests"""
-    prs = data['pull_requests']
+    prs = list(store.data['pull_requests'])
     if team:
         prs = [pr for pr in prs if pr.get('team') == team]
     return {
@@ -80,7 +207,7 @@ def get_pull_requests(team: Optional[str] = Query(None)):
 @app.get('/api/testing')
 def get_testing(team: Optional[str] = Query(None)):
     """Get testing activities"""
-    tests = data['testing']
+    tests = list(store.data['testing'])
     if team:
         tests = [t for t in tests if t.get('team') == team]
     return {
@@ -93,7 +220,7 @@ def get_testing(team: Optional[str] = Query(None)):
 @app.get('/api/prod-support')
 def get_prod_support(team: Optional[str] = Query(None)):
     """Get production support activities"""
-    support = data['prod_support']
+    support = list(store.data['prod_support'])
     if team:
         support = [s for s in support if s.get('team') == team]
     return {
@@ -105,7 +232,7 @@ def get_prod_support(team: Optional[str] = Query(None)):
 @app.get('/api/prod-issues')
 def get_prod_issues(team: Optional[str] = Query(None)):
     """Get production issues"""
-    issues = data['prod_issues']
+    issues = list(store.data['prod_issues'])
     if team:
         issues = [i for i in issues if i.get('team') == team]
     return {
@@ -116,150 +243,125 @@ def get_prod_issues(team: Optional[str] = Query(None)):
         'avg_resolution_time': sum([i.get('resolution_time', 0) for i in issues if i['status'] == 'Resolved']) / max(1, len([i for i in issues if i['status'] == 'Resolved']))
     }
 
+@app.get('/api/percentiles')
+def get_percentiles(
+    team: Optional[List[str]] = Query(None),
+    member: Optional[str] = Query(None),
+    by_member: bool = Query(False)
+):
+    """p50/p90/p99 of PR cycle time, incident resolution time and story time.
+
+    Several teams are combined by merging their sketches; omit team for all teams.
+    """
+    result = {'percentiles': percentile_index.summary(team, member)}
+    if by_member:
+        result['members'] = percentile_index.member_summaries(team)
+    return result
+
+@app.get('/api/ci/pipelines')
+def get_ci_pipelines(
+    days: int = Query(30, ge=1),
+    team: Optional[str] = Query(None)
+):
+    """Pipeline counts, success rate and average duration per day"""
+    result = ci_activity.summary(team, days)
+    keys = ('pipelines', 'success', 'failed', 'success_rate', 'avg_duration_minutes')
+    return {
+        'summary': {k: result['summary'][k] for k in keys},
+        'daily': {day: {k: bucket[k] for k in keys} for day, bucket in result['daily'].items()}
+    }
+
+@app.get('/api/ci/commits')
+def get_ci_commits(
+    days: int = Query(30, ge=1),
+    team: Optional[str] = Query(None)
+):
+    """Commit counts and line changes per day"""
+    result = ci_activity.summary(team, days)
+    keys = ('commits', 'additions', 'deletions')
+    return {
+        'summary': {k: result['summary'][k] for k in keys},
+        'daily': {day: {k: bucket[k] for k in keys} for day, bucket in result['daily'].items()}
+    }
+
 @app.get('/api/insights')
 def get_insights(team: Optional[str] = Query(None)):
     """Get AI-generated insights about productivity"""
-    stories = data['user_stories']
-    prs = data['pull_requests']
-    tests = data['testing']
-    support = data['prod_support']
-    issues = data['prod_issues']
-    
-    if team:
-        stories = [s for s in stories if s.get('team') == team]
-        prs = [pr for pr in prs if pr.get('team') == team]
-        tests = [t for t in tests if t.get('team') == team]
-        support = [s for s in support if s.get('team') == team]
-        issues = [i for i in issues if i.get('team') == team]
-    
-    total_time = sum([
-        sum([s['time_spent'] for s in stories]),
-        sum([pr['time_spent'] for pr in prs]),
-        sum([t['time_spent'] for t in tests]),
-        sum([s['time_spent'] for s in support]),
-        sum([i['time_spent'] for i in issues])
-    ])
-    
-    prod_support_time = sum([s['time_spent'] for s in support])
-    prod_issues_time = sum([i['time_spent'] for i in issues])
-    testing_time = sum([t['time_spent'] for t in tests])
-    development_time = sum([s['time_spent'] for s in stories]) + sum([pr['time_spent'] for pr in prs])
-    
-    insights = []
-    
-    if total_time > 0:
-        prod_support_pct = (prod_support_time / total_time) * 100
-        prod_issues_pct = (prod_issues_time / total_time) * 100
-        testing_pct = (testing_time / total_time) * 100
-        dev_pct = (development_time / total_time) * 100
-        
-        if prod_support_pct > 25:
-            insights.append({
-                'type': 'warning',
-                'title': 'High Production Support Time',
-                'message': f'{prod_support_pct:.1f}% of time spent on production support. Consider improving monitoring and preventive measures.',
-                'value': prod_support_pct
-            })
-        
-        if prod_issues_pct > 20:
-            insights.append({
-                'type': 'critical',
-                'title': 'Excessive Production Issues',
-                'message': f'{prod_issues_pct:.1f}% of time spent on production issues. This indicates quality concerns.',
-                'value': prod_issues_pct
-            })
-        
-        if testing_pct < 15:
-            insights.append({
-                'type': 'warning',
-                'title': 'Low Testing Coverage',
-                'message': f'Only {testing_pct:.1f}% of time spent on testing. Consider increasing test coverage.',
-                'value': testing_pct
-            })
-        
-        if dev_pct > 50:
-            insights.append({
-                'type': 'success',
-                'title': 'Good Development Focus',
-                'message': f'{dev_pct:.1f}% of time focused on development. Team is productive on new features.',
-                'value': dev_pct
-            })
-    
-    avg_pr_time = sum([pr['time_spent'] for pr in prs]) / max(1, len(prs))
-    if avg_pr_time > 16:
-        insights.append({
-            'type': 'warning',
-            'title': 'Long PR Review Times',
-            'message': f'Average PR takes {avg_pr_time:.1f} hours. Consider streamlining review process.',
-            'value': avg_pr_time
-        })
-    
-    return {'insights': insights}
+    return warmup.get('insights', team)
 
 @app.get('/api/trends')
-def get_trends(
+def get_productivity_trends(
     days: int = Query(30),
     team: Optional[str] = Query(None)
 ):
     """Get productivity trends over time"""
-    stories = data['user_stories']
-    prs = data['pull_requests']
-    tests = data['testing']
-    support = data['prod_support']
-    issues = data['prod_issues']
-    
-    if team:
-        stories = [s for s in stories if s.get('team') == team]
-        prs = [pr for pr in prs if pr.get('team') == team]
-        tests = [t for t in tests if t.get('team') == team]
-        support = [s for s in support if s.get('team') == team]
-        issues = [i for i in issues if i.get('team') == team]
-    
-    trends = {}
-    base_date = datetime.now() - timedelta(days=days)
-    
-    for i in range(days):
-        date = (base_date + timedelta(days=i)).strftime('%Y-%m-%d')
-        trends[date] = {
-            'development': 0,
-            'testing': 0,
-            'prod_support': 0,
-            'prod_issues': 0
-        }
-    
-    for story in stories:
-        date = story['created_date']
-        if date in trends:
-            trends[date]['development'] += story['time_spent'] / 7
-    
-    for pr in prs:
-        date = pr['created_date']
-        if date in trends:
-            trends[date]['development'] += pr['time_spent'] / 7
-    
-    for test in tests:
-        date = test['date']
-        if date in trends:
-            trends[date]['testing'] += test['time_spent']
-    
-    for sup in support:
-        date = sup['date']
-        if date in trends:
-            trends[date]['prod_support'] += sup['time_spent']
-    
-    for issue in issues:
-        date = issue['reported_date']
-        if date in trends:
-            trends[date]['prod_issues'] += issue['time_spent']
-    
-    return {
-        'dates': list(trends.keys()),
-        'data': trends
+    if days == TRENDS_DAYS:
+        return warmup.get('trends', team)
+    return get_trends(store.data, days, team, store.retention)
+
+@app.get('/api/history')
+def get_history(
+    date_from: Optional[str] = Query(None, pattern=r'^\d{4}-\d{2}-\d{2}$'),
+    date_to: Optional[str] = Query(None, pattern=r'^\d{4}-\d{2}-\d{2}$'),
+    days: int = Query(365, ge=1),
+    granularity: str = Query('auto', pattern='^(auto|day|week|month)$'),
+    team: Optional[str] = Query(None)
+):
+    """Long-range trends from the history store (daily rows or weekly/monthly rollups)"""
+    if not history_store:
+        raise HTTPException(status_code=404, detail='History is disabled (HISTORY_DB is empty)')
+    date_to = date_to or datetime.now().strftime('%Y-%m-%d')
+    date_from = date_from or (datetime.strptime(date_to, '%Y-%m-%d') - timedelta(days=days)).strftime('%Y-%m-%d')
+    return history_store.query(date_from, date_to, team, granularity)
+
+def _is_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d') == value
+    except ValueError:
+        return False
+
+@app.get('/api/query')
+def query_activities(
+    types: Optional[List[str]] = Query(None),
+    assignee: Optional[List[str]] = Query(None),
+    team: Optional[List[str]] = Query(None),
+    status: Optional[List[str]] = Query(None),
+    priority: Optional[List[str]] = Query(None),
+    severity: Optional[List[str]] = Query(None),
+    type: Optional[List[str]] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    match: str = Query('all', pattern='^(all|any)$'),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Filter activities across collections using the bitmap indexes.
+
+    Repeated values of one field are OR-ed; different fields are AND-ed
+    (match=all) or OR-ed (match=any). Dates are inclusive YYYY-MM-DD bounds.
+    """
+    collections = types or COLLECTIONS
+    unknown = [name for name in collections if name not in COLLECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f'Unknown activity types: {", ".join(unknown)}')
+    for value in (date_from, date_to):
+        # Index days are compared as strings, so only zero-padded dates are valid
+        if value is not None and not _is_date(value):
+            raise HTTPException(status_code=400, detail=f'Invalid date {value!r}, expected YYYY-MM-DD')
+    filters = {
+        field: values
+        for field, values in [
+            ('assignee', assignee), ('team', team), ('status', status),
+            ('priority', priority), ('severity', severity), ('type', type)
+        ]
+        if values
     }
+    return query_index.query(collections, filters, date_from, date_to, match, offset, limit)
 
 @app.get('/api/teams')
 def get_teams():
     """Get list of all teams"""
+    data = store.data
     teams = set()
     for item in data['user_stories']:
         if 'team' in item:
@@ -278,6 +380,87 @@ def get_teams():
             teams.add(item['team'])
     return {'teams': sorted(list(teams))}
 
+@app.get('/api/stream')
+async def stream_metrics(team: Optional[str] = Query(None)):
+    """Server-Sent Events stream of metric diffs for a team"""
+    team = team or None
+    if broadcaster.full():
+        raise HTTPException(status_code=503, detail='Too many stream subscribers')
+    return StreamingResponse(
+        broadcaster.events(team),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _check_webhook_token(token):
+    # Webhooks change live data, so they are disabled until a secret is configured
+    if not config.WEBHOOK_SECRET:
+        raise HTTPException(status_code=403, detail='Webhooks are disabled; set WEBHOOK_SECRET to enable them')
+    if not hmac.compare_digest(token or '', config.WEBHOOK_SECRET):
+        raise HTTPException(status_code=401, detail='Invalid webhook token')
+
+def _apply_changes(changes):
+    # In shared mode the change is journaled so every worker applies it
+    (shared_snapshot or store).apply(changes)
+    return {'applied': len(changes), 'version': store.version}
+
+@app.post('/api/webhooks/jira')
+def jira_webhook(
+    payload: dict = Body(...),
+    token: Optional[str] = Query(None),
+    x_webhook_token: Optional[str] = Header(None)
+):
+    """Apply a Jira issue created/updated/deleted event to the live snapshot"""
+    _check_webhook_token(token or x_webhook_token)
+    try:
+        changes = jira_event_changes(payload)
+    except (KeyError, AttributeError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f'Unsupported Jira payload: {e}')
+    return _apply_changes(changes)
+
+@app.post('/api/webhooks/gitlab')
+def gitlab_webhook(
+    payload: dict = Body(...),
+    x_gitlab_token: Optional[str] = Header(None)
+):
+    """Apply a GitLab merge request event to the live snapshot"""
+    _check_webhook_token(x_gitlab_token)
+    try:
+        changes = gitlab_event_changes(payload, store)
+    except (KeyError, AttributeError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f'Unsupported GitLab payload: {e}')
+    return _apply_changes(changes)
+
+@app.get('/api/profiles')
+def list_profiles():
+    """List captured request profiles"""
+    return {
+        'profiles': profile_store.list(),
+        'sampler': sampling_profiler.status()
+    }
+
+@app.get('/api/profiles/sampler')
+def get_sampler_profile(reset: bool = Query(False)):
+    """Download the process-wide sampling profile as folded stacks"""
+    if not sampling_profiler.running and not sampling_profiler.total_samples:
+        raise HTTPException(status_code=404, detail='Sampling profiler is not enabled')
+    folded = sampling_profiler.folded()
+    if reset:
+        sampling_profiler.reset()
+    return PlainTextResponse(folded, headers={
+        'Content-Disposition': 'attachment; filename="sampler.folded"'
+    })
+
+@app.get('/api/profiles/{profile_id}')
+def download_profile(profile_id: str):
+    """Download a captured request profile in pstats format"""
+    entry = profile_store.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail='Profile not found')
+    return Response(entry['stats'], media_type='application/octet-stream', headers={
+        'Content-Disposition': f'attachment; filename="{profile_id}.prof"'
+    })
+
 if __name__ == '__main__':
     import uvicorn
     uvicorn.run(app, host='127.0.0.1', port=5001)
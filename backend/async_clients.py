@@ -0,0 +1,238 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from urllib.parse import urlparse, quote
+import httpx
+from config import config
+from http_transport import http_transport, backoff_delay, RETRY_STATUSES
+from jira_integration import jira_integration, unified_jql, IssueCollector, JIRA_FIELDS, PAGE_SIZE
+from gitlab_integration import gitlab_integration
+from team_resolver import team_resolver
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one host.
+
+    The limit grows by roughly one slot per window of successful requests and
+    halves on a throttle, 5xx or connection error, so in-flight requests track
+    what the upstream can actually absorb.
+    """
+
+    def __init__(self, initial, maximum, minimum=1):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, ok):
+        async with self._condition:
+            self.in_flight -= 1
+            if ok:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.minimum, self.limit / 2)
+            self._condition.notify_all()
+
+
+class AsyncHTTP:
+    """httpx.AsyncClient with per-host adaptive concurrency, shared request budgets and retries"""
+
+    def __init__(self, initial_concurrency=None, max_concurrency=None, max_retries=None, **client_options):
+        self.initial_concurrency = initial_concurrency or config.ASYNC_INITIAL_CONCURRENCY
+        self.max_concurrency = max_concurrency or config.ASYNC_MAX_CONCURRENCY
+        self.retries = config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        limits = httpx.Limits(max_connections=self.max_concurrency * 4, max_keepalive_connections=self.max_concurrency)
+        self.client = httpx.AsyncClient(limits=limits, timeout=30, **client_options)
+        self.limiters = {}
+
+    def _limiter(self, host):
+        if host not in self.limiters:
+            self.limiters[host] = AdaptiveLimiter(self.initial_concurrency, self.max_concurrency)
+        return self.limiters[host]
+
+    async def request(self, method, url, **kwargs):
+        limiter = self._limiter(urlparse(url).hostname or '')
+        bucket, stats = http_transport.budget(url)
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = bucket.reserve()
+            stats['requests'] += 1
+            await limiter.acquire()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                await limiter.release(False)
+                stats['errors'] += 1
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            throttled = response.status_code in RETRY_STATUSES
+            await limiter.release(not throttled)
+            if not throttled or attempt >= self.retries:
+                response.raise_for_status()
+                return response
+
+            delay = backoff_delay(attempt, response)
+            if response.status_code == 429:
+                stats['throttled'] += 1
+                bucket.pause(min(delay, config.HTTP_MAX_BACKOFF))
+            if delay > config.HTTP_MAX_BACKOFF:
+                response.raise_for_status()
+            stats['retries'] += 1
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class AsyncJiraClient:
+    """Jira REST search, classified and mapped with the same functions as the synchronous integration"""
+
+    def __init__(self, http):
+        self.http = http
+        self.base = config.JIRA_URL.rstrip('/')
+        self.auth = (config.JIRA_EMAIL, config.JIRA_API_TOKEN)
+
+    async def collections(self, scope):
+        """Every Jira collection of a scope from one paged, field-projected search"""
+        collector = IssueCollector(jira_integration)
+        start = 0
+        while not collector.done(start):
+            response = await self.http.get(
+                f'{self.base}/rest/api/2/search',
+                params={'jql': unified_jql(scope), 'startAt': start, 'maxResults': PAGE_SIZE, 'fields': ','.join(JIRA_FIELDS)},
+                auth=self.auth
+            )
+            page = response.json()
+            issues = page.get('issues', [])
+            for raw in issues:
+                collector.add(jira_integration.issue_from_raw(raw))
+            start += len(issues)
+            if len(issues) < PAGE_SIZE or start >= page.get('total', 0):
+                break
+        return collector.collections
+
+
+def _count(value):
+    """GitLab reports large counts as strings such as '1000+'"""
+    try:
+        return int(str(value).rstrip('+'))
+    except (TypeError, ValueError):
+        return 1
+
+
+class AsyncGitLabClient:
+    """GitLab REST v4 client for merge requests, commits and pipelines"""
+
+    def __init__(self, http):
+        self.http = http
+        self.base = f'{config.GITLAB_URL.rstrip("/")}/api/v4'
+        self.headers = {'PRIVATE-TOKEN': config.GITLAB_TOKEN}
+
+    def _url(self, project_id, path=''):
+        url = f'{self.base}/projects/{quote(str(project_id), safe="")}'
+        return f'{url}/{path}' if path else url
+
+    async def get(self, project_id, path, **params):
+        response = await self.http.get(self._url(project_id, path), params=params, headers=self.headers)
+        return response.json()
+
+    async def paginate(self, project_id, path, **params):
+        """Every item of a listing, following the X-Next-Page header"""
+        params.setdefault('per_page', 100)
+        items = []
+        page = 1
+        while page:
+            response = await self.http.get(
+                self._url(project_id, path), params={**params, 'page': page}, headers=self.headers
+            )
+            items.extend(response.json())
+            page = int(response.headers.get('X-Next-Page') or 0)
+        return items
+
+    async def merge_request(self, project_id, mr):
+        """Pull request record for a listed MR, with diff stats and commit count"""
+        changes, commits = await asyncio.gather(
+            self.get(project_id, f'merge_requests/{mr["iid"]}/changes'),
+            self.paginate(project_id, f'merge_requests/{mr["iid"]}/commits')
+        )
+        lines_added = lines_deleted = 0
+        for change in changes.get('changes', []):
+            lines_added += change.get('additions', 0)
+            lines_deleted += change.get('deletions', 0)
+        mr = SimpleNamespace(**{**mr, 'changes_count': _count(mr.get('changes_count'))})
+        return gitlab_integration._build_mr_record(mr, lines_added, lines_deleted, len(commits))
+
+    async def merge_requests(self, project_id):
+        mrs = await self.get(project_id, 'merge_requests', state='all', order_by='created_at', sort='desc', per_page=50)
+        return await asyncio.gather(*(self.merge_request(project_id, mr) for mr in mrs))
+
+    async def project_team(self, project_id):
+        """Same mapping as GitLabIntegration.project_team, sharing its cache"""
+        if project_id in config.GITLAB_PROJECT_TEAMS:
+            return config.GITLAB_PROJECT_TEAMS[project_id]
+        teams = gitlab_integration._project_teams
+        if project_id not in teams:
+            project = (await self.http.get(self._url(project_id), headers=self.headers)).json()
+            labels = list(project.get('topics') or []) + [project.get('name', ''), project.get('path_with_namespace', '')]
+            teams[project_id] = team_resolver.resolve(labels) or team_resolver.default_team
+        return teams[project_id]
+
+    async def pipelines(self, project_id, updated_after=None):
+        params = {'order_by': 'updated_at', 'sort': 'asc'}
+        if updated_after:
+            params['updated_after'] = updated_after
+        return [SimpleNamespace(**p) for p in await self.paginate(project_id, 'pipelines', **params)]
+
+    async def pipeline_duration(self, project_id, pipeline_id):
+        return (await self.get(project_id, f'pipelines/{pipeline_id}')).get('duration')
+
+    async def commits(self, project_id, since=None):
+        params = {'with_stats': 'true'}
+        if since:
+            params['since'] = since
+        return [SimpleNamespace(**c) for c in await self.paginate(project_id, 'repository/commits', **params)]
+
+
+async def fetch_jira_scope(http, scope):
+    """Jira collections of one JQL scope (an ingestion shard)"""
+    return await AsyncJiraClient(http).collections(scope)
+
+
+async def fetch_gitlab_project(http, project_id):
+    """Pull requests of one GitLab project (an ingestion shard)"""
+    return {'pull_requests': await AsyncGitLabClient(http).merge_requests(project_id)}
+
+
+def run_async(coroutine):
+    """Run a coroutine to completion from synchronous code, even if the caller's thread has a loop"""
+    result = {}
+
+    def target():
+        try:
+            result['value'] = asyncio.run(coroutine)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target, name='async-ingestion')
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
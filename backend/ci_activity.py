@@ -0,0 +1,345 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from config import config
+from gitlab_integration import gitlab_integration
+from aggregates import ALL_TEAMS
+from async_clients import AsyncHTTP, AsyncGitLabClient, run_async
+from circuit import breakers
+
+# Pipeline states that will not change again
+FINISHED_STATES = {'success', 'failed', 'canceled', 'skipped'}
+
+# State file the leader writes to the shared snapshot directory for the other workers
+STATE_FILE = 'ci_activity.json'
+
+
+def _empty_day():
+    return {
+        'pipelines': 0,
+        'success': 0,
+        'failed': 0,
+        'duration_total': 0,
+        'duration_count': 0,
+        'commits': 0,
+        'additions': 0,
+        'deletions': 0
+    }
+
+
+class CIActivity:
+    """Pipeline and commit counters per team and per day, ingested incrementally from GitLab.
+
+    Each refresh asks every project only for pipelines updated and commits
+    authored after the last watermark, following pagination. A pipeline that
+    was seen running is replaced when it finishes, so its old contribution is
+    subtracted first. Requests read the precomputed day buckets and never
+    call GitLab. With a shared snapshot only the leader worker refreshes; it
+    writes its state next to the snapshot and the other workers load it.
+    """
+
+    def __init__(self, integration, days=None, refresh_interval=None):
+        self.integration = integration
+        self.days = days or config.CI_ACTIVITY_DAYS
+        self.refresh_interval = refresh_interval or config.CI_REFRESH_INTERVAL
+        self.buckets = {}
+        self.pipelines = {}
+        self.commits = {}
+        self.watermarks = {}
+        self.last_refresh = None
+        self.errors = {}
+        self.shared = None
+        self._state_mtime = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _cutoff(self):
+        return (datetime.now(timezone.utc) - timedelta(days=self.days)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _add(self, team, day, values, sign):
+        for scope in (team, ALL_TEAMS):
+            bucket = self.buckets.setdefault(scope, {}).setdefault(day, _empty_day())
+            for key, value in values.items():
+                bucket[key] += value * sign
+
+    def add_pipeline(self, project_id, team, pipeline, duration=None):
+        """Count a pipeline, replacing what an earlier refresh recorded for it"""
+        key = (project_id, pipeline.id)
+        values = {
+            'pipelines': 1,
+            'success': 1 if pipeline.status == 'success' else 0,
+            'failed': 1 if pipeline.status == 'failed' else 0,
+            'duration_total': duration or 0,
+            'duration_count': 1 if duration else 0
+        }
+        entry = (team, pipeline.created_at[:10], pipeline.status, values)
+        with self._lock:
+            previous = self.pipelines.get(key)
+            if previous is not None:
+                self._add(previous[0], previous[1], previous[3], -1)
+            self.pipelines[key] = entry
+            self._add(team, entry[1], values, 1)
+
+    def add_commit(self, project_id, team, commit):
+        key = (project_id, commit.id)
+        stats = getattr(commit, 'stats', None) or {}
+        values = {
+            'commits': 1,
+            'additions': stats.get('additions', 0),
+            'deletions': stats.get('deletions', 0)
+        }
+        with self._lock:
+            if key in self.commits:
+                return
+            self.commits[key] = (team, commit.created_at[:10])
+            self._add(team, commit.created_at[:10], values, 1)
+
+    def _known_duration(self, project_id, pipeline):
+        """(duration, whether it still has to be fetched) for a listed pipeline"""
+        listed = getattr(pipeline, 'duration', None)
+        if listed is not None:
+            return listed, False
+        previous = self.pipelines.get((project_id, pipeline.id))
+        if previous is not None and previous[2] == pipeline.status:
+            # Already fetched when it finished
+            return previous[3]['duration_total'] or None, False
+        return None, pipeline.status in FINISHED_STATES
+
+    def _duration(self, project_id, pipeline):
+        duration, fetch = self._known_duration(project_id, pipeline)
+        if fetch:
+            duration = self.integration.get_pipeline_duration(project_id, pipeline.id)
+        return duration
+
+    def refresh_project(self, project_id):
+        team = self.integration.project_team(project_id)
+        cutoff = self._cutoff()
+
+        key = ('pipelines', project_id)
+        watermark = self.watermarks.get(key, cutoff)
+        for pipeline in self.integration.iter_pipelines(project_id, updated_after=watermark):
+            if pipeline.created_at < cutoff:
+                continue
+            self.add_pipeline(project_id, team, pipeline, self._duration(project_id, pipeline))
+            watermark = max(watermark, pipeline.updated_at)
+            self.watermarks[key] = watermark
+
+        # Commits come newest first, so the watermark only moves once the listing completes
+        key = ('commits', project_id)
+        watermark = self.watermarks.get(key, cutoff)
+        for commit in self.integration.iter_commits(project_id, since=watermark):
+            self.add_commit(project_id, team, commit)
+            watermark = max(watermark, commit.created_at)
+        self.watermarks[key] = watermark
+
+    async def refresh_project_async(self, client, project_id):
+        """refresh_project on an AsyncGitLabClient; pipeline durations are fetched concurrently"""
+        team = await client.project_team(project_id)
+        cutoff = self._cutoff()
+
+        key = ('pipelines', project_id)
+        watermark = self.watermarks.get(key, cutoff)
+        pipelines = [p for p in await client.pipelines(project_id, updated_after=watermark) if p.created_at >= cutoff]
+        known = [self._known_duration(project_id, pipeline) for pipeline in pipelines]
+        fetched = await asyncio.gather(*(
+            client.pipeline_duration(project_id, pipeline.id) if fetch else asyncio.sleep(0, duration)
+            for pipeline, (duration, fetch) in zip(pipelines, known)
+        ))
+        for pipeline, duration in zip(pipelines, fetched):
+            self.add_pipeline(project_id, team, pipeline, duration)
+            watermark = max(watermark, pipeline.updated_at)
+        self.watermarks[key] = watermark
+
+        key = ('commits', project_id)
+        watermark = self.watermarks.get(key, cutoff)
+        for commit in await client.commits(project_id, since=watermark):
+            self.add_commit(project_id, team, commit)
+            watermark = max(watermark, commit.created_at)
+        self.watermarks[key] = watermark
+
+    async def refresh_async(self):
+        """Ingest every project concurrently on one event loop"""
+        breaker = breakers['gitlab']
+        http = AsyncHTTP()
+        client = AsyncGitLabClient(http)
+        project_ids = [project_id for project_id in breaker.by_trial(self.integration.project_ids()) if breaker.allow(project_id)]
+        try:
+            results = await asyncio.gather(
+                *(self.refresh_project_async(client, project_id) for project_id in project_ids),
+                return_exceptions=True
+            )
+        finally:
+            await http.aclose()
+        for project_id, result in zip(project_ids, results):
+            if isinstance(result, Exception):
+                breaker.record_error(result)
+                self.errors[project_id] = str(result)
+            else:
+                breaker.record_success()
+                self.errors.pop(project_id, None)
+        self.prune()
+        self.last_refresh = datetime.now(timezone.utc).isoformat()
+
+    def refresh(self):
+        """Ingest new activity from every configured project"""
+        if not self.integration.enabled:
+            return
+        if config.ASYNC_INGESTION:
+            run_async(self.refresh_async())
+            return
+        breaker = breakers['gitlab']
+        for project_id in breaker.by_trial(self.integration.project_ids()):
+            if not breaker.allow(project_id):
+                # GitLab is failing; keep serving the buckets we already have
+                continue
+            try:
+                self.refresh_project(project_id)
+                breaker.record_success()
+                self.errors.pop(project_id, None)
+            except Exception as e:
+                # Watermarks only advance past ingested items; the next refresh resumes
+                breaker.record_error(e)
+                self.errors[project_id] = str(e)
+        self.prune()
+        self.last_refresh = datetime.now(timezone.utc).isoformat()
+
+    def prune(self):
+        """Drop days (and the per-item entries behind them) older than the window"""
+        first_day = self._cutoff()[:10]
+        with self._lock:
+            for days in self.buckets.values():
+                for day in [day for day in days if day < first_day]:
+                    del days[day]
+            self.pipelines = {k: v for k, v in self.pipelines.items() if v[1] >= first_day}
+            self.commits = {k: v for k, v in self.commits.items() if v[1] >= first_day}
+
+    def daily(self, team=ALL_TEAMS, days=30):
+        """Per-day buckets for the last `days` days with derived rates"""
+        first_day = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d')
+        with self._lock:
+            series = {
+                day: dict(bucket)
+                for day, bucket in sorted(self.buckets.get(team, {}).items())
+                if day >= first_day
+            }
+        return {day: self._with_rates(bucket) for day, bucket in series.items()}
+
+    def summary(self, team=ALL_TEAMS, days=30):
+        series = self.daily(team, days)
+        totals = _empty_day()
+        for bucket in series.values():
+            for key in totals:
+                totals[key] += bucket[key]
+        return {'summary': self._with_rates(totals), 'daily': series}
+
+    @staticmethod
+    def _with_rates(bucket):
+        finished = bucket['success'] + bucket['failed']
+        bucket['success_rate'] = round(bucket['success'] / finished * 100, 1) if finished else None
+        bucket['avg_duration_minutes'] = (
+            round(bucket['duration_total'] / bucket['duration_count'] / 60, 1)
+            if bucket['duration_count'] else None
+        )
+        return bucket
+
+    def share(self, shared_snapshot):
+        """Refresh only while `shared_snapshot` holds the leader lock; otherwise load the leader's state"""
+        self.shared = shared_snapshot
+
+    def _state_path(self):
+        return os.path.join(self.shared.directory, STATE_FILE)
+
+    def save(self):
+        """Write buckets, per-item entries and watermarks for the other workers"""
+        with self._lock:
+            state = {
+                'buckets': [[team, day, bucket] for team, days in self.buckets.items() for day, bucket in days.items()],
+                'pipelines': [[list(key), list(entry)] for key, entry in self.pipelines.items()],
+                'commits': [[list(key), list(entry)] for key, entry in self.commits.items()],
+                'watermarks': [[list(key), value] for key, value in self.watermarks.items()],
+                'last_refresh': self.last_refresh,
+                'errors': [[project_id, error] for project_id, error in self.errors.items()]
+            }
+        path = self._state_path()
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def load(self):
+        """Replace the local state with the leader's if it changed"""
+        path = self._state_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._state_mtime:
+            return False
+        with open(path) as f:
+            state = json.load(f)
+        buckets = {}
+        for team, day, bucket in state['buckets']:
+            buckets.setdefault(team, {})[day] = bucket
+        with self._lock:
+            self.buckets = buckets
+            self.pipelines = {tuple(key): tuple(entry) for key, entry in state['pipelines']}
+            self.commits = {tuple(key): tuple(entry) for key, entry in state['commits']}
+            self.watermarks = {tuple(key): value for key, value in state['watermarks']}
+            self.last_refresh = state['last_refresh']
+            self.errors = dict((project_id, error) for project_id, error in state['errors'])
+        self._state_mtime = mtime
+        return True
+
+    def start(self):
+        if not self.integration.enabled or self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name='ci-activity', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def tick(self):
+        """Refresh when due (leader or unshared), or pick up the leader's state"""
+        if self.shared is None:
+            self.refresh()
+            return
+        if not self.shared.is_leader:
+            self.load()
+            return
+        if self._refreshed_at is None:
+            # Continue from the previous leader's watermarks
+            self.load()
+        if self._refreshed_at is None or time.time() - self._refreshed_at >= self.refresh_interval:
+            self.refresh()
+            self._refreshed_at = time.time()
+            self.save()
+
+    def _run(self):
+        interval = self.shared.poll_interval if self.shared else self.refresh_interval
+        while True:
+            try:
+                self.tick()
+            except Exception:
+                pass
+            if self._stop.wait(interval):
+                return
+
+    def status(self):
+        return {
+            'enabled': self.integration.enabled,
+            'projects': len(self.integration.project_ids()) if self.integration.enabled else 0,
+            'pipelines': len(self.pipelines),
+            'commits': len(self.commits),
+            'last_refresh': self.last_refresh,
+            'role': None if self.shared is None else ('leader' if self.shared.is_leader else 'follower'),
+            'errors': self.errors
+        }
+
+
+ci_activity = CIActivity(gitlab_integration)
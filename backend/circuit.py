@@ -0,0 +1,136 @@
+import threading
+import time
+import httpx
+from config import config
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def is_unavailable(error):
+    """Whether an error says the source itself is unavailable: a transport error, timeout, 429 or 5xx.
+
+    Other errors, such as a 404 for a deleted project or a 403 for one without
+    access, only concern the shard that raised them.
+    """
+    status = getattr(error, 'response_code', None) or getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # requests' exceptions are OSErrors, as are connection errors and timeouts
+    return isinstance(error, (OSError, httpx.TransportError))
+
+
+class CircuitBreaker:
+    """Per-source circuit breaker with last-known-good results.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are refused without touching the upstream (negative caching). Once the
+    open period has passed a single trial call is let through; failure reopens
+    the circuit for twice as long, up to `max_timeout`, and success closes it.
+    Only errors for which `is_unavailable` holds count as failures; any other
+    error on the trial call shows the source is up and closes the circuit.
+    The trial goes to the key tried least recently (see `by_trial`), so one
+    broken key cannot keep the circuit open for the others. Successful
+    results are remembered per key and served, marked stale, while the
+    source is failing.
+    """
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None, max_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or config.CIRCUIT_RESET_TIMEOUT
+        self.max_timeout = max_timeout or config.CIRCUIT_MAX_TIMEOUT
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = None
+        self.last_success = None
+        self.last_failure = None
+        self.last_error = None
+        self.last_good = {}
+        self.stale = {}
+        self.tried = {}
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self, key=None):
+        """Whether a call to the upstream (for `key`) may be made now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() >= self.retry_at:
+                self.state = HALF_OPEN
+                self._trial = False
+            if self.state == HALF_OPEN and not self._trial:
+                self._trial = True
+                self.tried[key] = time.time()
+                return True
+            return False
+
+    def by_trial(self, items, key=lambda item: item):
+        """`items` ordered so the least recently tried comes first and gets the next trial"""
+        with self._lock:
+            return sorted(items, key=lambda item: self.tried.get(key(item), 0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened = 0
+            self.retry_at = None
+            self.last_success = time.time()
+
+    def record_error(self, error):
+        """Record an error raised by a call, counting it only if the source is unavailable"""
+        if is_unavailable(error):
+            self.record_failure(error)
+        elif self.state == HALF_OPEN:
+            # The trial got an answer, so the source is back
+            self.record_success()
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_failure = time.time()
+            self.last_error = str(error)
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened += 1
+                timeout = min(self.max_timeout, self.reset_timeout * 2 ** (self.opened - 1))
+                self.state = OPEN
+                self.retry_at = time.time() + timeout
+
+    def remember(self, key, value):
+        with self._lock:
+            self.last_good[key] = (value, time.time())
+            self.stale.pop(key, None)
+
+    def recall(self, key, default=None):
+        """Last good value for a key (marking it stale), or `default`"""
+        with self._lock:
+            if key not in self.last_good:
+                return default
+            value, fetched_at = self.last_good[key]
+            self.stale[key] = fetched_at
+            return value
+
+    def status(self):
+        with self._lock:
+            oldest = min(self.stale.values()) if self.stale else None
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'retry_at': self.retry_at,
+                'last_success': self.last_success,
+                'last_failure': self.last_failure,
+                'last_error': self.last_error,
+                'stale': bool(self.stale),
+                'stale_keys': sorted(self.stale),
+                'stale_since': oldest,
+                'stale_seconds': round(time.time() - oldest, 1) if oldest else None
+            }
+
+
+breakers = {name: CircuitBreaker(name) for name in ('jira', 'gitlab')}
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,11 +10,25 @@ class Config:
     JIRA_EMAIL = os.getenv('JIRA_EMAIL', '')
     JIRA_API_TOKEN = os.getenv('JIRA_API_TOKEN', '')
     JIRA_PROJECT_KEY = os.getenv('JIRA_PROJECT_KEY', '')
+    # Several projects (comma-separated) and/or extra JQL scopes (JSON list), each ingested as its own shard
+    JIRA_PROJECT_KEYS = [key.strip() for key in (os.getenv('JIRA_PROJECT_KEYS') or JIRA_PROJECT_KEY).split(',') if key.strip()]
+    JIRA_SCOPES = json.loads(os.getenv('JIRA_SCOPES', '[]'))
+    # Upper bound on issues scanned per scope while filling every collection
+    JIRA_MAX_ISSUES = int(os.getenv('JIRA_MAX_ISSUES', '1000'))
+    # Pages still read for sparse collections once the first collection is full
+    JIRA_EXTRA_PAGES = int(os.getenv('JIRA_EXTRA_PAGES', '2'))
     
     # GitLab Configuration
     GITLAB_URL = os.getenv('GITLAB_URL', 'https://gitlab.com')
     GITLAB_TOKEN = os.getenv('GITLAB_TOKEN', '')
     GITLAB_PROJECT_IDS = os.getenv('GITLAB_PROJECT_IDS', '').split(',') if os.getenv('GITLAB_PROJECT_IDS') else []
+    # Groups whose projects (including subgroups) are ingested as well
+    GITLAB_GROUP_IDS = [group.strip() for group in os.getenv('GITLAB_GROUP_IDS', '').split(',') if group.strip()]
+    # Optional project -> team mapping, e.g. {"123": "Team Alpha"}; otherwise matched from topics/name
+    GITLAB_PROJECT_TEAMS = json.loads(os.getenv('GITLAB_PROJECT_TEAMS', '{}'))
+    # Pipeline/commit ingestion window (days) and refresh interval (seconds)
+    CI_ACTIVITY_DAYS = int(os.getenv('CI_ACTIVITY_DAYS', '90'))
+    CI_REFRESH_INTERVAL = int(os.getenv('CI_REFRESH_INTERVAL', '300'))
     
     # Confluence Configuration
     CONFLUENCE_URL = os.getenv('CONFLUENCE_URL', '')
@@ -21,12 +36,85 @@ class Config:
     CONFLUENCE_API_TOKEN = os.getenv('CONFLUENCE_API_TOKEN', '')
     CONFLUENCE_SPACE_KEY = os.getenv('CONFLUENCE_SPACE_KEY', '')
     
+    # Shared HTTP transport for all integrations
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+    HTTP_MAX_PER_HOST = int(os.getenv('HTTP_MAX_PER_HOST', '8'))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '5'))
+    HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', '0.5'))
+    HTTP_MAX_BACKOFF = float(os.getenv('HTTP_MAX_BACKOFF', '60'))
+    # Requests per second per host, with overrides, e.g. {"gitlab.com": 5}
+    HTTP_DEFAULT_RATE = float(os.getenv('HTTP_DEFAULT_RATE', '10'))
+    HTTP_BUDGETS = json.loads(os.getenv('HTTP_BUDGETS', '{}'))
+    
+    # Sharded ingestion: worker threads, per-shard timeout and whole-run timeout (seconds)
+    INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '8'))
+    INGEST_SHARD_TIMEOUT = float(os.getenv('INGEST_SHARD_TIMEOUT', '120'))
+    INGEST_RUN_TIMEOUT = float(os.getenv('INGEST_RUN_TIMEOUT', '600'))
+    
+    # Circuit breaker per source: failures before opening, first open period and its cap (seconds)
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+    CIRCUIT_MAX_TIMEOUT = float(os.getenv('CIRCUIT_MAX_TIMEOUT', '600'))
+    
+    # Threads precomputing overview, team performance, insights and trends after each snapshot
+    WARMUP_WORKERS = int(os.getenv('WARMUP_WORKERS', '4'))
+    
+    # Fetch through asyncio httpx clients instead of the SDKs; per-host concurrency adapts between 1 and the max
+    ASYNC_INGESTION = os.getenv('ASYNC_INGESTION', 'false').lower() == 'true'
+    ASYNC_INITIAL_CONCURRENCY = int(os.getenv('ASYNC_INITIAL_CONCURRENCY', '4'))
+    ASYNC_MAX_CONCURRENCY = int(os.getenv('ASYNC_MAX_CONCURRENCY', '64'))
+    
     # Team Configuration
     TEAMS = os.getenv('TEAMS', 'Team Alpha,Team Beta,Team Gamma').split(',')
     
+    # Insight thresholds per team, e.g. {"Team Beta": {"high_prod_support": 30}, "*": {...}}
+    INSIGHT_THRESHOLDS = json.loads(os.getenv('INSIGHT_THRESHOLDS', '{}'))
+    
+    # Anomaly insights: days scanned, baseline window, z-score threshold, EWMA smoothing,
+    # how many recent days are reported and the fewest hours that count as a spike
+    ANOMALY_HISTORY_DAYS = int(os.getenv('ANOMALY_HISTORY_DAYS', '90'))
+    ANOMALY_WINDOW = int(os.getenv('ANOMALY_WINDOW', '14'))
+    ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', '3'))
+    ANOMALY_EWMA_ALPHA = float(os.getenv('ANOMALY_EWMA_ALPHA', '0.3'))
+    ANOMALY_RECENT_DAYS = int(os.getenv('ANOMALY_RECENT_DAYS', '7'))
+    ANOMALY_MIN_HOURS = float(os.getenv('ANOMALY_MIN_HOURS', '2'))
+    
+    # Columnar snapshot used instead of mock_data.json when present
+    SNAPSHOT_FILE = os.getenv('SNAPSHOT_FILE', '')
+    
+    # Shared snapshot across uvicorn workers (disabled when no directory is set)
+    SHARED_SNAPSHOT_DIR = os.getenv('SHARED_SNAPSHOT_DIR', '')
+    SNAPSHOT_REFRESH_INTERVAL = int(os.getenv('SNAPSHOT_REFRESH_INTERVAL', '300'))
+    SNAPSHOT_POLL_INTERVAL = float(os.getenv('SNAPSHOT_POLL_INTERVAL', '2'))
+    
+    # Shared secret for /api/webhooks/* (X-Gitlab-Token, X-Webhook-Token or ?token=); webhooks are off without it
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+    
+    # Server-Sent Events (/api/stream)
+    SSE_MAX_CONNECTIONS = int(os.getenv('SSE_MAX_CONNECTIONS', '10000'))
+    SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', '16'))
+    SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', '15'))
+    
+    # Historical aggregates (SQLite); empty path disables history. Retention in days, 0 = keep forever
+    HISTORY_DB = os.getenv('HISTORY_DB', 'history.db')
+    HISTORY_DAILY_RETENTION_DAYS = int(os.getenv('HISTORY_DAILY_RETENTION_DAYS', '400'))
+    HISTORY_WEEKLY_RETENTION_DAYS = int(os.getenv('HISTORY_WEEKLY_RETENTION_DAYS', '1100'))
+    HISTORY_MONTHLY_RETENTION_DAYS = int(os.getenv('HISTORY_MONTHLY_RETENTION_DAYS', '0'))
+    
+    # Days of raw records kept in memory; older ones are compacted into aggregates (0 keeps everything raw)
+    RAW_RETENTION_DAYS = int(os.getenv('RAW_RETENTION_DAYS', '0'))
+    RETENTION_COMPACT_INTERVAL = float(os.getenv('RETENTION_COMPACT_INTERVAL', '3600'))
+    
     # Cache Configuration
     CACHE_EXPIRY = int(os.getenv('CACHE_EXPIRY', '300'))
     
+    # Profiling Configuration
+    PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile')
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_MAX_STORED = int(os.getenv('PROFILE_MAX_STORED', '50'))
+    PROFILE_SAMPLING = os.getenv('PROFILE_SAMPLING', 'false').lower() == 'true'
+    PROFILE_SAMPLING_INTERVAL = float(os.getenv('PROFILE_SAMPLING_INTERVAL', '0.01'))
+    
     # Use mock data if APIs not configured
     USE_MOCK_DATA = not all([JIRA_URL, JIRA_API_TOKEN, GITLAB_TOKEN])
 
@@ -1,5 +1,7 @@
 from atlassian import Confluence
 from config import config
+from team_resolver import team_resolver
+from http_transport import http_transport
 from datetime import datetime, timedelta
 from cachetools import TTLCache
 
@@ -12,7 +14,8 @@ class ConfluenceIntegration:
                 url=config.CONFLUENCE_URL,
                 username=config.CONFLUENCE_EMAIL,
                 password=config.CONFLUENCE_API_TOKEN,
-                cloud=True
+                cloud=True,
+                session=http_transport.session()
             )
             self.enabled = True
         else:
@@ -170,14 +173,9 @@ class ConfluenceIntegration:
     def _extract_team_from_labels(self, labels):
         """Extract team from Confluence labels"""
         if not labels:
-            return config.TEAMS[0] if config.TEAMS else 'Default Team'
+            return team_resolver.default_team
         
-        for label in labels:
-            label_name = label.get('name', '').lower()
-            for team in config.TEAMS:
-                if team.lower().replace(' ', '') in label_name:
-                    return team
-        
-        return config.TEAMS[0] if config.TEAMS else 'Default Team'
+        names = [label.get('name', '') for label in labels]
+        return team_resolver.resolve(names) or team_resolver.default_team
 
 confluence_integration = ConfluenceIntegration()
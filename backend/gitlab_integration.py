@@ -1,177 +1,159 @@
 import gitlab
 from config import config
+from team_resolver import team_resolver
+from http_transport import http_transport
 from datetime import datetime
-from cachetools import TTLCache
+from types import SimpleNamespace
 
-cache = TTLCache(maxsize=100, ttl=config.CACHE_EXPIRY)
+class TransportGitlab(gitlab.Gitlab):
+    """python-gitlab client without its own 429/5xx retry loop; the shared HTTP transport owns backoff"""
+    
+    def http_request(self, *args, **kwargs):
+        # obey_rate_limit can only be set per request
+        kwargs.setdefault('obey_rate_limit', False)
+        kwargs.setdefault('retry_transient_errors', False)
+        return super().http_request(*args, **kwargs)
 
 class GitLabIntegration:
     def __init__(self):
         if config.GITLAB_URL and config.GITLAB_TOKEN:
-            self.gl = gitlab.Gitlab(config.GITLAB_URL, private_token=config.GITLAB_TOKEN)
+            self.gl = TransportGitlab(
+                config.GITLAB_URL,
+                private_token=config.GITLAB_TOKEN,
+                retry_transient_errors=False,
+                session=http_transport.session()
+            )
             self.enabled = True
         else:
             self.gl = None
             self.enabled = False
+        self._projects = {}
+        self._project_teams = {}
+        self._group_projects = {}
     
-    def get_merge_requests(self):
-        """Fetch merge requests (pull requests) from GitLab"""
-        if not self.enabled:
-            return []
-        
-        cache_key = 'gitlab_mrs'
-        if cache_key in cache:
-            return cache[cache_key]
-        
-        try:
-            merge_requests = []
-            
-            for project_id in config.GITLAB_PROJECT_IDS:
-                if not project_id.strip():
-                    continue
-                    
-                try:
-                    project = self.gl.projects.get(project_id.strip())
-                    mrs = project.mergerequests.list(state='all', order_by='created_at', sort='desc', per_page=50)
-                    
-                    for mr in mrs:
-                        # Determine team from labels or branch
-                        team = self._extract_team_from_labels(mr.labels)
-                        
-                        # Calculate time spent (hours between created and merged/closed)
-                        time_spent = self._calculate_mr_time(mr)
-                        
-                        # Get diff stats
-                        changes = mr.changes() if hasattr(mr, 'changes') else {}
-                        lines_added = sum(change.get('additions', 0) for change in changes.get('changes', []))
-                        lines_deleted = sum(change.get('deletions', 0) for change in changes.get('changes', []))
-                        
-                        mr_data = {
-                            'id': f'MR-{mr.iid}',
-                            'title': mr.title,
-                            'status': self._map_mr_state(mr.state),
-                            'author': mr.author['name'] if mr.author else 'Unknown',
-                            'reviewer': self._get_reviewer(mr),
-                            'team': team,
-                            'created_date': mr.created_at[:10],
-                            'time_spent': time_spent,
-                            'lines_added': lines_added if lines_added > 0 else mr.changes_count * 50,  # Estimate
-                            'lines_deleted': lines_deleted if lines_deleted > 0 else mr.changes_count * 20,  # Estimate
-                            'comments': mr.user_notes_count,
-                            'commits': len(mr.commits().list()) if hasattr(mr, 'commits') else 1
-                        }
-                        merge_requests.append(mr_data)
-                        
-                except Exception as e:
-                    continue
-            
-            cache[cache_key] = merge_requests
-            return merge_requests
-            
-        except Exception as e:
-            return []
+    def fetch_project_mrs(self, project_id):
+        """Pull request records for one project's latest merge requests; errors propagate"""
+        project = self._project(project_id)
+        mrs = project.mergerequests.list(state='all', order_by='created_at', sort='desc', per_page=50)
+        records = []
+        for mr in mrs:
+            # Get diff stats
+            changes = mr.changes() if hasattr(mr, 'changes') else {}
+            lines_added = sum(change.get('additions', 0) for change in changes.get('changes', []))
+            lines_deleted = sum(change.get('deletions', 0) for change in changes.get('changes', []))
+            commits = len(mr.commits().list()) if hasattr(mr, 'commits') else 1
+            records.append(self._build_mr_record(mr, lines_added, lines_deleted, commits))
+        return records
     
-    def get_pipeline_statistics(self):
-        """Fetch CI/CD pipeline statistics"""
-        if not self.enabled:
-            return {}
-        
-        cache_key = 'gitlab_pipelines'
-        if cache_key in cache:
-            return cache[cache_key]
-        
-        try:
-            pipeline_stats = {
-                'total_pipelines': 0,
-                'successful': 0,
-                'failed': 0,
-                'avg_duration': 0
-            }
-            
-            total_duration = 0
-            
-            for project_id in config.GITLAB_PROJECT_IDS:
-                if not project_id.strip():
-                    continue
-                    
-                try:
-                    project = self.gl.projects.get(project_id.strip())
-                    pipelines = project.pipelines.list(per_page=20)
-                    
-                    for pipeline in pipelines:
-                        pipeline_stats['total_pipelines'] += 1
-                        
-                        if pipeline.status == 'success':
-                            pipeline_stats['successful'] += 1
-                        elif pipeline.status == 'failed':
-                            pipeline_stats['failed'] += 1
-                        
-                        if pipeline.duration:
-                            total_duration += pipeline.duration
-                            
-                except Exception as e:
-                    continue
-            
-            if pipeline_stats['total_pipelines'] > 0:
-                pipeline_stats['avg_duration'] = total_duration / pipeline_stats['total_pipelines'] / 60  # Convert to minutes
-            
-            cache[cache_key] = pipeline_stats
-            return pipeline_stats
-            
-        except Exception as e:
-            return {}
+    def project_ids(self):
+        """Configured projects plus the projects of configured groups (as last expanded)"""
+        ids = [pid.strip() for pid in config.GITLAB_PROJECT_IDS if pid.strip()]
+        for group_ids in self._group_projects.values():
+            ids.extend(pid for pid in group_ids if pid not in ids)
+        return ids
     
-    def get_commit_activity(self):
-        """Fetch recent commit activity"""
-        if not self.enabled:
-            return []
-        
-        cache_key = 'gitlab_commits'
-        if cache_key in cache:
-            return cache[cache_key]
-        
-        try:
-            commits = []
-            
-            for project_id in config.GITLAB_PROJECT_IDS:
-                if not project_id.strip():
-                    continue
-                    
-                try:
-                    project = self.gl.projects.get(project_id.strip())
-                    project_commits = project.commits.list(per_page=50)
-                    
-                    for commit in project_commits:
-                        commit_data = {
-                            'id': commit.short_id,
-                            'message': commit.title,
-                            'author': commit.author_name,
-                            'date': commit.created_at[:10],
-                            'additions': commit.stats.get('additions', 0) if hasattr(commit, 'stats') else 0,
-                            'deletions': commit.stats.get('deletions', 0) if hasattr(commit, 'stats') else 0
-                        }
-                        commits.append(commit_data)
-                        
-                except Exception as e:
-                    continue
-            
-            cache[cache_key] = commits
-            return commits
-            
-        except Exception as e:
-            return []
+    def expand_group(self, group_id):
+        """Refresh the project list of a group, including subgroups"""
+        group = self.gl.groups.get(group_id, lazy=True)
+        projects = group.projects.list(include_subgroups=True, archived=False, per_page=100, iterator=True)
+        self._group_projects[group_id] = [str(project.id) for project in projects]
+        return self._group_projects[group_id]
+    
+    def _project(self, project_id):
+        """Lazy project handle (no API call), created once per project"""
+        if project_id not in self._projects:
+            self._projects[project_id] = self.gl.projects.get(project_id, lazy=True)
+        return self._projects[project_id]
+    
+    def project_team(self, project_id):
+        """Team owning a project: GITLAB_PROJECT_TEAMS, else topics/name/path matched against TEAMS"""
+        if project_id in config.GITLAB_PROJECT_TEAMS:
+            return config.GITLAB_PROJECT_TEAMS[project_id]
+        if project_id not in self._project_teams:
+            try:
+                project = self.gl.projects.get(project_id)
+                labels = list(getattr(project, 'topics', None) or []) + [project.name, project.path_with_namespace]
+                self._project_teams[project_id] = team_resolver.resolve(labels) or team_resolver.default_team
+            except Exception as e:
+                return team_resolver.default_team
+        return self._project_teams[project_id]
+    
+    def iter_pipelines(self, project_id, updated_after=None):
+        """Pipelines updated after a watermark, oldest first, following pagination"""
+        params = {'order_by': 'updated_at', 'sort': 'asc', 'per_page': 100, 'iterator': True}
+        if updated_after:
+            params['updated_after'] = updated_after
+        return self._project(project_id).pipelines.list(**params)
+    
+    def get_pipeline_duration(self, project_id, pipeline_id):
+        """Duration in seconds; only the single-pipeline endpoint reports it"""
+        pipeline = self._project(project_id).pipelines.get(pipeline_id)
+        return pipeline.duration
+    
+    def iter_commits(self, project_id, since=None):
+        """Commits on the default branch since a watermark, with diff stats, following pagination"""
+        params = {'with_stats': True, 'per_page': 100, 'iterator': True}
+        if since:
+            params['since'] = since
+        return self._project(project_id).commits.list(**params)
+    
+    def _build_mr_record(self, mr, lines_added, lines_deleted, commits):
+        """Map a merge request to a pull request record"""
+        return {
+            'id': mr_record_id(mr.project_id, mr.iid),
+            'title': mr.title,
+            'status': self._map_mr_state(mr.state),
+            'author': mr.author['name'] if mr.author else 'Unknown',
+            'reviewer': self._get_reviewer(mr),
+            # Determine team from labels or branch
+            'team': self._extract_team_from_labels(mr.labels),
+            'created_date': mr.created_at[:10],
+            # Calculate time spent (hours between created and merged/closed)
+            'time_spent': self._calculate_mr_time(mr),
+            'lines_added': lines_added if lines_added > 0 else mr.changes_count * 50,  # Estimate
+            'lines_deleted': lines_deleted if lines_deleted > 0 else mr.changes_count * 20,  # Estimate
+            'comments': mr.user_notes_count,
+            'commits': commits
+        }
+    
+    def normalize_mr_event(self, payload, existing=None):
+        """Map a merge request webhook payload to a pull request record.
+
+        Hook payloads omit the author name, diff stats and commit count, so those
+        are kept from the existing record when there is one.
+        """
+        attrs = payload['object_attributes']
+        state = attrs.get('state', 'opened')
+        author = None
+        if existing:
+            author = {'name': existing['author']}
+        elif attrs.get('action') == 'open' and payload.get('user'):
+            author = {'name': payload['user'].get('name', 'Unknown')}
+        mr = SimpleNamespace(
+            iid=attrs['iid'],
+            project_id=attrs.get('target_project_id') or (payload.get('project') or {}).get('id'),
+            title=attrs.get('title', ''),
+            state=state,
+            author=author,
+            reviewers=payload.get('reviewers') or [],
+            assignee=(payload.get('assignees') or [None])[0],
+            labels=[label.get('title', '') for label in payload.get('labels') or []],
+            created_at=_normalize_timestamp(attrs['created_at']),
+            merged_at=_normalize_timestamp(attrs.get('merged_at') or (attrs.get('updated_at') if state == 'merged' else None)),
+            closed_at=_normalize_timestamp(attrs.get('closed_at') or (attrs.get('updated_at') if state in ('closed', 'locked') else None)),
+            changes_count=int(attrs.get('changes_count') or 1),
+            user_notes_count=existing['comments'] if existing else 0
+        )
+        return self._build_mr_record(
+            mr,
+            existing['lines_added'] if existing else 0,
+            existing['lines_deleted'] if existing else 0,
+            existing['commits'] if existing else 1
+        )
     
     def _extract_team_from_labels(self, labels):
         """Extract team from GitLab labels"""
-        if not labels:
-            return config.TEAMS[0] if config.TEAMS else 'Default Team'
-        
-        for label in labels:
-            for team in config.TEAMS:
-                if team.lower().replace(' ', '') in label.lower():
-                    return team
-        
-        return config.TEAMS[0] if config.TEAMS else 'Default Team'
+        return team_resolver.resolve(labels) or team_resolver.default_team
     
     def _map_mr_state(self, state):
         """Map GitLab MR state to our status"""
@@ -211,4 +193,16 @@ class GitLabIntegration:
         except:
             return 8.0  # Default estimate
 
+def mr_record_id(project_id, iid):
+    """Pull request id; MR iids are only unique within a project"""
+    return f'MR-{project_id}-{iid}'
+
+def _normalize_timestamp(value):
+    """Convert GitLab hook timestamps ('2024-01-05 10:00:00 UTC') to ISO 8601"""
+    if not value:
+        return None
+    if value.endswith(' UTC'):
+        return value[:-len(' UTC')].replace(' ', 'T') + 'Z'
+    return value
+
 gitlab_integration = GitLabIntegration()
@@ -0,0 +1,302 @@
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from config import config
+from models import BASE_DIR, COLLECTIONS, DATE_FIELDS
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    team TEXT NOT NULL,
+    category TEXT NOT NULL,
+    source TEXT NOT NULL,
+    time REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, team, category, source)
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    granularity TEXT NOT NULL,
+    period TEXT NOT NULL,
+    team TEXT NOT NULL,
+    category TEXT NOT NULL,
+    time REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, period, team, category)
+);
+'''
+
+# SQL expression giving the first day of the period containing `day`
+PERIOD_START = {
+    'week': "date(day, 'weekday 0', '-6 days')",
+    'month': "date(day, 'start of month')"
+}
+
+# Span (days) up to which `granularity=auto` picks each resolution
+AUTO_GRANULARITY = [(92, 'day'), (731, 'week')]
+
+# Records without a team are kept under this key
+NO_TEAM = ''
+
+# Source of daily rows written before rows were kept per source
+LEGACY_SOURCE = '(legacy)'
+
+
+def record_source(record):
+    """Upstream slice a record was fetched with, from its id: the Jira project key or the GitLab project"""
+    record_id = str(record.get('id', ''))
+    return record_id.rsplit('-', 1)[0] if '-' in record_id else ''
+
+
+def period_start(day, granularity):
+    """First day (ISO string) of the week or month containing `day`"""
+    value = date.fromisoformat(day)
+    if granularity == 'week':
+        value -= timedelta(days=value.weekday())
+    elif granularity == 'month':
+        value = value.replace(day=1)
+    return value.isoformat()
+
+
+class HistoryStore:
+    """Daily per-team, per-category aggregates in SQLite with weekly and monthly rollups.
+
+    Each full snapshot is folded into the `daily` table, so history outlives
+    the records the integrations still return. Every Jira project and GitLab
+    project is fetched with its own limit, so rows are kept per source and a
+    snapshot only replaces the days it fully covers for each source. Rollups for the touched periods
+    are recomputed in the same transaction and old rows are pruned per
+    resolution, which keeps long-range queries to a handful of rows.
+    """
+
+    def __init__(self, path, daily_retention=None, weekly_retention=None, monthly_retention=None):
+        self.path = path
+        self.retention = {
+            'day': config.HISTORY_DAILY_RETENTION_DAYS if daily_retention is None else daily_retention,
+            'week': config.HISTORY_WEEKLY_RETENTION_DAYS if weekly_retention is None else weekly_retention,
+            'month': config.HISTORY_MONTHLY_RETENTION_DAYS if monthly_retention is None else monthly_retention
+        }
+        self.last_recorded = None
+        self.last_error = None
+        self.shared = None
+        self._pending = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._queue_lock = threading.Lock()
+        with self._connect() as conn:
+            self._migrate(conn)
+            conn.executescript(SCHEMA)
+            self._legacy = conn.execute(
+                'SELECT 1 FROM daily WHERE source = ? LIMIT 1', (LEGACY_SOURCE,)
+            ).fetchone() is not None
+
+    @staticmethod
+    def _migrate(conn):
+        """Move a daily table without the source column aside and copy its rows as legacy rows"""
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(daily)')]
+        if not columns or 'source' in columns:
+            return
+        conn.execute('ALTER TABLE daily RENAME TO daily_unsourced')
+        conn.executescript(SCHEMA)
+        conn.execute(
+            'INSERT INTO daily (day, team, category, source, time, count) '
+            'SELECT day, team, category, ?, time, count FROM daily_unsourced', (LEGACY_SOURCE,)
+        )
+        conn.execute('DROP TABLE daily_unsourced')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def daily_totals(data):
+        """{(day, team, category, source): [time, count]} for a snapshot, plus the oldest day per (category, source)"""
+        totals = defaultdict(lambda: [0.0, 0])
+        oldest = {}
+        for name in COLLECTIONS:
+            date_field = DATE_FIELDS[name]
+            for record in data[name]:
+                day = record.get(date_field)
+                if not day:
+                    continue
+                source = record_source(record)
+                entry = totals[(day, record.get('team') or NO_TEAM, name, source)]
+                entry[0] += record.get('time_spent') or 0
+                entry[1] += 1
+                key = (name, source)
+                if key not in oldest or day < oldest[key]:
+                    oldest[key] = day
+        return totals, oldest
+
+    def record(self, data, today=None):
+        """Fold a full snapshot into history and refresh the affected rollups.
+
+        For each category and source, the days after its oldest day in the
+        snapshot are replaced. That oldest day may be cut off by the source's
+        fetch limit, so it only fills a gap and never overwrites what is
+        already stored. Sources missing from the snapshot keep their rows.
+        """
+        totals, oldest = self.daily_totals(data)
+        if not totals:
+            return 0
+        today = today or date.today()
+        with self._lock, self._connect() as conn:
+            floor = conn.execute('SELECT MIN(day) FROM daily').fetchone()[0]
+            for (name, source), first_day in oldest.items():
+                conn.execute(
+                    'DELETE FROM daily WHERE category = ? AND source = ? AND day > ?', (name, source, first_day)
+                )
+            for (day, team, name, source), (time_spent, count) in totals.items():
+                if self._legacy:
+                    # Rows from before sources were tracked are superseded wherever the snapshot has data
+                    conn.execute(
+                        'DELETE FROM daily WHERE day = ? AND team = ? AND category = ? AND source = ?',
+                        (day, team, name, LEGACY_SOURCE)
+                    )
+                verb = 'INSERT OR IGNORE' if day == oldest[(name, source)] else 'INSERT OR REPLACE'
+                conn.execute(
+                    f'{verb} INTO daily (day, team, category, source, time, count) VALUES (?, ?, ?, ?, ?, ?)',
+                    (day, team, name, source, round(time_spent, 4), count)
+                )
+            self._rollup(conn, min(oldest.values()), floor)
+            self._prune(conn, today)
+        self.last_recorded = today.isoformat()
+        return len(totals)
+
+    def _rollup(self, conn, since, floor):
+        """Recompute rollups from `since` on.
+
+        Periods starting before `floor` (the oldest daily row before this
+        refresh) may have lost days to retention, so their existing rollups
+        are kept and only missing ones are filled in.
+        """
+        for granularity, expression in PERIOD_START.items():
+            start = period_start(since, granularity)
+            complete = start
+            if floor:
+                complete = period_start(floor, granularity)
+                if complete < floor:
+                    complete = self._next_period(complete, granularity)
+            conn.execute(
+                'DELETE FROM rollups WHERE granularity = ? AND period >= ?',
+                (granularity, max(start, complete))
+            )
+            conn.execute(
+                f'''INSERT OR IGNORE INTO rollups (granularity, period, team, category, time, count)
+                    SELECT ?, {expression} AS period, team, category, SUM(time), SUM(count)
+                    FROM daily WHERE day >= ?
+                    GROUP BY period, team, category''',
+                (granularity, start)
+            )
+
+    @staticmethod
+    def _next_period(start, granularity):
+        value = date.fromisoformat(start)
+        if granularity == 'week':
+            return (value + timedelta(days=7)).isoformat()
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1).isoformat()
+
+    def _cutoff(self, granularity, today):
+        days = self.retention[granularity]
+        return (today - timedelta(days=days)).isoformat() if days else None
+
+    def _prune(self, conn, today):
+        cutoff = self._cutoff('day', today)
+        if cutoff:
+            conn.execute('DELETE FROM daily WHERE day < ?', (cutoff,))
+        for granularity in PERIOD_START:
+            cutoff = self._cutoff(granularity, today)
+            if cutoff:
+                conn.execute(
+                    'DELETE FROM rollups WHERE granularity = ? AND period < ?', (granularity, cutoff)
+                )
+
+    def query(self, date_from, date_to, team=None, granularity='auto'):
+        """Per-period, per-category totals between two ISO dates (inclusive)"""
+        if granularity == 'auto':
+            span = (date.fromisoformat(date_to) - date.fromisoformat(date_from)).days
+            granularity = next((g for limit, g in AUTO_GRANULARITY if span <= limit), 'month')
+
+        if granularity == 'day':
+            sql = 'SELECT day, category, SUM(time), SUM(count) FROM daily WHERE day BETWEEN ? AND ?'
+            params = [date_from, date_to]
+        else:
+            sql = '''SELECT period, category, SUM(time), SUM(count) FROM rollups
+                     WHERE granularity = ? AND period BETWEEN ? AND ?'''
+            params = [granularity, period_start(date_from, granularity), date_to]
+        if team is not None:
+            sql += ' AND team = ?'
+            params.append(team)
+        sql += ' GROUP BY 1, 2 ORDER BY 1'
+
+        periods = {}
+        with self._connect() as conn:
+            for period, name, time_spent, count in conn.execute(sql, params):
+                if period not in periods:
+                    periods[period] = {
+                        category: {'time': 0, 'count': 0} for category in COLLECTIONS
+                    }
+                periods[period][name] = {'time': round(time_spent, 2), 'count': count}
+        return {
+            'granularity': granularity,
+            'periods': list(periods),
+            'data': periods
+        }
+
+    def share(self, shared_snapshot):
+        """Record only while `shared_snapshot` holds the leader lock; every worker publishes the same data"""
+        self.shared = shared_snapshot
+
+    def listener(self, store, change=None):
+        """SnapshotStore listener: record every full snapshot (webhook changes wait for the next one).
+
+        The write runs on a background thread, so publishing never waits for
+        SQLite; snapshots published meanwhile collapse into the latest one.
+        """
+        if change is not None or (self.shared is not None and not self.shared.is_leader):
+            return
+        with self._queue_lock:
+            self._pending = dict(store.data)
+            if self._running:
+                return
+            self._running = True
+        threading.Thread(target=self._run, name='history', daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._queue_lock:
+                data, self._pending = self._pending, None
+                if data is None:
+                    self._running = False
+                    return
+            try:
+                self.record(data)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+
+    def status(self):
+        with self._connect() as conn:
+            days = conn.execute('SELECT MIN(day), MAX(day), COUNT(*) FROM daily').fetchone()
+            rollups = dict(conn.execute('SELECT granularity, COUNT(*) FROM rollups GROUP BY granularity'))
+        return {
+            'path': self.path,
+            'first_day': days[0],
+            'last_day': days[1],
+            'daily_rows': days[2],
+            'rollup_rows': rollups,
+            'last_recorded': self.last_recorded,
+            'last_error': self.last_error
+        }
+
+
+# Relative paths are resolved under the backend directory, like the other data files
+history_store = HistoryStore(os.path.join(BASE_DIR, config.HISTORY_DB)) if config.HISTORY_DB else None
@@ -0,0 +1,171 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from config import config
+
+# Statuses worth retrying; 429 is safe for any method since the request was not processed
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class TokenBucket:
+    """Request budget for one upstream: `rate` requests per second with bursts up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return 0, or return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        wait = self.reserve()
+        while wait:
+            time.sleep(wait)
+            wait = self.reserve()
+
+    def pause(self, seconds):
+        """Hold every caller back, e.g. while the upstream asks us to via Retry-After"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def retry_after(response):
+    """Seconds requested by a Retry-After header (delta or HTTP date), or None"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, response=None, backoff=None, max_backoff=None):
+    """Retry-After when the response carries one, else exponential backoff with jitter"""
+    if response is not None:
+        requested = retry_after(response)
+        if requested is not None:
+            return requested
+    backoff = config.HTTP_BACKOFF if backoff is None else backoff
+    max_backoff = max_backoff or config.HTTP_MAX_BACKOFF
+    return min(max_backoff, backoff * 2 ** attempt) * random.uniform(0.5, 1)
+
+
+class HTTPTransport(HTTPAdapter):
+    """Pooled requests adapter shared by every integration.
+
+    Connections are kept alive in per-host pools. Each host gets a
+    concurrency limit and a token-bucket budget, and throttled or transient
+    failures are retried with exponential backoff and jitter, honouring
+    Retry-After. A 429 pauses the whole host, not just the request that saw
+    it, so concurrent callers back off together.
+    """
+
+    def __init__(self, max_per_host=None, max_retries=None, backoff=None, max_backoff=None,
+                 default_rate=None, budgets=None, pool_size=None):
+        self.max_per_host = max_per_host or config.HTTP_MAX_PER_HOST
+        self.retries = config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = config.HTTP_BACKOFF if backoff is None else backoff
+        self.max_backoff = max_backoff or config.HTTP_MAX_BACKOFF
+        self.default_rate = default_rate or config.HTTP_DEFAULT_RATE
+        self.budgets = config.HTTP_BUDGETS if budgets is None else budgets
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+        self.stats = {}
+        size = pool_size or config.HTTP_POOL_SIZE
+        super().__init__(pool_connections=size, pool_maxsize=size)
+
+    def _host(self, url):
+        host = urlparse(url).hostname or ''
+        with self._hosts_lock:
+            if host not in self._hosts:
+                rate = self.budgets.get(host, self.default_rate)
+                self._hosts[host] = (
+                    threading.BoundedSemaphore(self.max_per_host),
+                    TokenBucket(rate, max(1, rate * 2))
+                )
+                self.stats[host] = {'requests': 0, 'retries': 0, 'throttled': 0, 'errors': 0}
+        return host
+
+    def _delay(self, attempt, response=None):
+        return backoff_delay(attempt, response, self.backoff, self.max_backoff)
+
+    def budget(self, url):
+        """(token bucket, stats) of the host behind a URL, shared with the async clients"""
+        host = self._host(url)
+        return self._hosts[host][1], self.stats[host]
+
+    def send(self, request, **kwargs):
+        host = self._host(request.url)
+        semaphore, bucket = self._hosts[host]
+        stats = self.stats[host]
+        retryable = request.method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            bucket.acquire()
+            stats['requests'] += 1
+            try:
+                with semaphore:
+                    response = super().send(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                stats['errors'] += 1
+                if not retryable or attempt >= self.retries:
+                    raise
+                time.sleep(self._delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                return response
+            if response.status_code != 429 and not retryable:
+                return response
+
+            delay = self._delay(attempt, response)
+            if response.status_code == 429:
+                stats['throttled'] += 1
+                bucket.pause(min(delay, self.max_backoff))
+            if delay > self.max_backoff:
+                # Upstream wants us gone for longer than we are willing to block a caller
+                return response
+            stats['retries'] += 1
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def mount_on(self, session):
+        """Route a session's http(s) traffic through this transport"""
+        session.mount('https://', self)
+        session.mount('http://', self)
+        return session
+
+    def session(self):
+        """New requests.Session that shares this transport's pools and budgets"""
+        return self.mount_on(requests.Session())
+
+    def status(self):
+        return {host: dict(values) for host, values in self.stats.items()}
+
+
+http_transport = HTTPTransport()
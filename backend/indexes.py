@@ -0,0 +1,208 @@
+import bisect
+import threading
+from array import array
+from models import COLLECTIONS, MEMBER_FIELDS, DATE_FIELDS
+
+# Filterable field -> record field, per collection (absent = not filterable there)
+FILTER_FIELDS = {
+    name: {
+        'assignee': MEMBER_FIELDS[name],
+        'team': 'team',
+        'status': 'status'
+    }
+    for name in COLLECTIONS
+}
+FILTER_FIELDS['user_stories'].update(priority='priority', type='type')
+FILTER_FIELDS['testing'].update(type='type')
+FILTER_FIELDS['prod_support'].update(priority='priority', type='type')
+FILTER_FIELDS['prod_issues'].update(severity='severity', priority='impact')
+
+
+def iter_bits(bitmap):
+    """Yield the positions of set bits in ascending order"""
+    bits = bin(bitmap)[:1:-1]
+    position = bits.find('1')
+    while position != -1:
+        yield position
+        position = bits.find('1', position + 1)
+
+
+class CollectionIndex:
+    """Per-value bitmaps over the rows of one collection.
+
+    Each record owns a slot (bit position); a bitmap per (field, value) has
+    the bits of matching slots set, so a conjunctive query is an AND of a few
+    Python ints and a disjunction within a field is an OR. Dates keep one
+    bitmap per day plus a sorted list of days for range lookups.
+
+    Records of the published snapshot are not kept: a slot stores the
+    record's position in that sequence, and only the page being returned is
+    read (decoded, for a memory-mapped snapshot). Records set by later
+    changes are kept by slot until replaced or removed.
+    """
+
+    def __init__(self, name, records):
+        self.name = name
+        self.fields = FILTER_FIELDS[name]
+        self.date_field = DATE_FIELDS[name]
+        self.source = records
+        self.positions = array('q')
+        self.changed = {}
+        self.slots = {}
+        self.live = 0
+        self.bitmaps = {field: {} for field in self.fields}
+        self.dates = {}
+        self.sorted_dates = []
+        for position, record in enumerate(records):
+            self._index(record, position)
+
+    def add(self, record):
+        self._index(record, None)
+
+    def _index(self, record, position):
+        """Index a record at `position` of the source, or held by its slot if None"""
+        slot = self.slots.get(record['id'])
+        if slot is None:
+            slot = self.slots[record['id']] = len(self.positions)
+            self.positions.append(-1)
+        if position is None:
+            self.positions[slot] = -1
+            self.changed[slot] = record
+        else:
+            self.positions[slot] = position
+            self.changed.pop(slot, None)
+        bit = 1 << slot
+        self.live |= bit
+        for field, record_field in self.fields.items():
+            value = record.get(record_field)
+            values = self.bitmaps[field]
+            values[value] = values.get(value, 0) | bit
+        day = record.get(self.date_field)
+        if day not in self.dates:
+            self.dates[day] = 0
+            if day is not None:
+                bisect.insort(self.sorted_dates, day)
+        self.dates[day] |= bit
+
+    def remove(self, record):
+        slot = self.slots.get(record['id'])
+        if slot is None:
+            return
+        mask = ~(1 << slot)
+        self.live &= mask
+        self.changed.pop(slot, None)
+        for field, record_field in self.fields.items():
+            values = self.bitmaps[field]
+            value = record.get(record_field)
+            if value in values:
+                values[value] &= mask
+                if not values[value]:
+                    del values[value]
+        day = record.get(self.date_field)
+        if day in self.dates:
+            self.dates[day] &= mask
+            if not self.dates[day]:
+                del self.dates[day]
+                if day is not None:
+                    self.sorted_dates.remove(day)
+
+    def _date_bitmap(self, date_from, date_to):
+        start = bisect.bisect_left(self.sorted_dates, date_from) if date_from else 0
+        end = bisect.bisect_right(self.sorted_dates, date_to) if date_to else len(self.sorted_dates)
+        bitmap = 0
+        for day in self.sorted_dates[start:end]:
+            bitmap |= self.dates[day]
+        return bitmap
+
+    def match(self, filters, date_from=None, date_to=None, match='all'):
+        """Bitmap of rows matching field filters ({field: [values]}) and a date range"""
+        terms = []
+        for field, values in filters.items():
+            if field not in self.fields:
+                terms.append(0)
+                continue
+            field_bitmaps = self.bitmaps[field]
+            bitmap = 0
+            for value in values:
+                bitmap |= field_bitmaps.get(value, 0)
+            terms.append(bitmap)
+        if date_from or date_to:
+            terms.append(self._date_bitmap(date_from, date_to))
+
+        if not terms:
+            return self.live
+        if match == 'any':
+            result = 0
+            for term in terms:
+                result |= term
+        else:
+            result = self.live
+            for term in terms:
+                result &= term
+                if not result:
+                    break
+        return result & self.live
+
+    def row(self, slot):
+        if slot in self.changed:
+            return self.changed[slot]
+        return self.source[self.positions[slot]]
+
+    def records(self, bitmap, offset=0, limit=None):
+        rows = []
+        for position, slot in enumerate(iter_bits(bitmap)):
+            if position < offset:
+                continue
+            if limit is not None and len(rows) >= limit:
+                break
+            rows.append(self.row(slot))
+        return rows
+
+
+class QueryIndex:
+    """Bitmap indexes for every collection, kept in sync with the SnapshotStore"""
+
+    def __init__(self):
+        self.collections = {name: CollectionIndex(name, []) for name in COLLECTIONS}
+        self._lock = threading.Lock()
+
+    def update(self, store, change=None):
+        """SnapshotStore listener: rebuild on publish, patch on record changes"""
+        with self._lock:
+            if change is None:
+                self.collections = {
+                    name: CollectionIndex(name, store.data[name]) for name in COLLECTIONS
+                }
+                return
+            index = self.collections[change['collection']]
+            if change['old'] is not None:
+                index.remove(change['old'])
+            if change['new'] is not None:
+                index.add(change['new'])
+
+    def query(self, collections, filters, date_from=None, date_to=None, match='all', offset=0, limit=100):
+        """Run a filter across collections; paging spans the combined result"""
+        with self._lock:
+            matches = [
+                (name, self.collections[name].match(filters, date_from, date_to, match))
+                for name in collections
+            ]
+            counts = {name: bitmap.bit_count() for name, bitmap in matches}
+            results = []
+            for name, bitmap in matches:
+                if len(results) >= limit:
+                    break
+                if offset >= counts[name]:
+                    offset -= counts[name]
+                    continue
+                for record in self.collections[name].records(bitmap, offset, limit - len(results)):
+                    results.append({'collection': name, **record})
+                offset = 0
+        return {
+            'total': sum(counts.values()),
+            'counts': counts,
+            'results': results
+        }
+
+
+query_index = QueryIndex()
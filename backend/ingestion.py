@@ -0,0 +1,262 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from cachetools import TTLCache
+from config import config
+from models import COLLECTIONS, empty_data
+from jira_integration import jira_integration, jira_scopes
+from gitlab_integration import gitlab_integration
+from async_clients import AsyncHTTP, fetch_jira_scope, fetch_gitlab_project, run_async
+from circuit import breakers
+
+
+class Shard:
+    """One independently fetched slice of the sources: a Jira scope or a GitLab project.
+
+    `fetch()` uses the SDK clients; `fetch_async(http)` returns a coroutine
+    using a shared AsyncHTTP.
+    """
+
+    def __init__(self, kind, key, fetch, fetch_async):
+        self.kind = kind
+        self.key = key
+        self.id = f'{kind}:{key}'
+        self.fetch = fetch
+        self.fetch_async = fetch_async
+
+
+def _jira_shard(scope):
+    return Shard(
+        'jira', scope,
+        lambda: jira_integration.fetch_scope(scope),
+        lambda http: fetch_jira_scope(http, scope)
+    )
+
+
+def _gitlab_shard(project_id):
+    return Shard(
+        'gitlab', project_id,
+        lambda: {'pull_requests': gitlab_integration.fetch_project_mrs(project_id)},
+        lambda http: fetch_gitlab_project(http, project_id)
+    )
+
+
+class ShardedIngestion:
+    """Fetches every Jira scope and GitLab project as a separate shard.
+
+    With the SDK clients, shards run on a pool of worker threads; a shard
+    still running from an earlier round is awaited again rather than started
+    twice. With ASYNC_INGESTION, all shards are tasks on one event loop
+    sharing one AsyncHTTP, so concurrency is bounded by the per-host adaptive
+    limits rather than by a thread count. Each shard has its own cache entry,
+    timeout and progress record. A shard that fails or times out contributes
+    its last good result instead, so one slow or broken project neither
+    delays nor blanks out the rest. Only unavailability errors (transport
+    errors, timeouts, 429, 5xx) count against the source's circuit breaker;
+    while it is open its shards are not fetched, except for the half-open
+    trial, which rotates over the shards.
+    """
+
+    def __init__(self, workers=None, shard_timeout=None, run_timeout=None, cache_ttl=None):
+        self.workers = workers or config.INGEST_WORKERS
+        self.shard_timeout = shard_timeout or config.INGEST_SHARD_TIMEOUT
+        self.run_timeout = run_timeout or config.INGEST_RUN_TIMEOUT
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ingest')
+        self.cache = TTLCache(maxsize=4096, ttl=cache_ttl or config.CACHE_EXPIRY)
+        self.progress = {}
+        self._running = {}
+        self.last_run = None
+        self._lock = threading.Lock()
+
+    def shards(self):
+        shards = []
+        if jira_integration.enabled:
+            shards.extend(_jira_shard(scope) for scope in jira_scopes())
+        if gitlab_integration.enabled:
+            for group_id in config.GITLAB_GROUP_IDS:
+                try:
+                    gitlab_integration.expand_group(group_id)
+                except Exception as e:
+                    # Keep the projects found by the last successful expansion
+                    continue
+            shards.extend(_gitlab_shard(project_id) for project_id in gitlab_integration.project_ids())
+        return shards
+
+    def _update(self, shard, **values):
+        with self._lock:
+            entry = self.progress.setdefault(shard.id, {'kind': shard.kind, 'key': shard.key})
+            entry.update(values)
+
+    def _start(self, shard):
+        started = time.time()
+        self._update(shard, state='running', started_at=started, error=None)
+        return started
+
+    def _succeeded(self, shard, result, started):
+        breaker = breakers[shard.kind]
+        breaker.record_success()
+        breaker.remember(shard.id, result)
+        self.cache[shard.id] = result
+        self._update(
+            shard, state='done', finished_at=time.time(), duration=round(time.time() - started, 3),
+            records=sum(len(records) for records in result.values()), stale=False
+        )
+
+    def _failed(self, shard, state, error, started=None):
+        breakers[shard.kind].record_error(error)
+        values = {'state': state, 'error': str(error)}
+        if started is not None:
+            values.update(finished_at=time.time(), duration=round(time.time() - started, 3))
+        self._update(shard, **values)
+
+    def _run_shard(self, shard):
+        started = self._start(shard)
+        try:
+            result = shard.fetch()
+        except Exception as e:
+            self._failed(shard, 'failed', e, started)
+            raise
+        self._succeeded(shard, result, started)
+        return result
+
+    def _timeout_error(self, shard_expired):
+        if shard_expired:
+            return TimeoutError(f'No result after the shard timeout of {self.shard_timeout}s')
+        return TimeoutError(f'Ingestion run timeout of {self.run_timeout}s reached')
+
+    def _by_trial(self, shards):
+        """Shards of each source with the least recently tried first, so half-open trials rotate"""
+        return [
+            ordered
+            for name, breaker in breakers.items()
+            for ordered in breaker.by_trial([shard for shard in shards if shard.kind == name], key=lambda shard: shard.id)
+        ]
+
+    def _fetch_threads(self, shards, run_started):
+        """Fetch shards on the worker pool; {shard id: result} for those that finished in time"""
+        results = {}
+        futures = {}
+        for shard in self._by_trial(shards):
+            future = self._running.get(shard.id)
+            if future is None or future.done():
+                if not breakers[shard.kind].allow(shard.id):
+                    self._update(shard, state='circuit_open')
+                    continue
+                self._update(shard, state='queued', queued_at=run_started, started_at=None)
+                future = self._running[shard.id] = self.executor.submit(self._run_shard, shard)
+            futures[future] = shard
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                shard = futures[future]
+                if future.exception() is None:
+                    results[shard.id] = future.result()
+            now = time.time()
+            for future in list(pending):
+                shard = futures[future]
+                started = self.progress.get(shard.id, {}).get('started_at')
+                shard_expired = started is not None and now - started > self.shard_timeout
+                if shard_expired or now - run_started > self.run_timeout:
+                    # Stop waiting; the thread finishes in the background and fills the cache
+                    pending.discard(future)
+                    self._failed(shard, 'timeout', self._timeout_error(shard_expired))
+        return results
+
+    async def _run_shard_async(self, http, shard):
+        started = self._start(shard)
+        try:
+            result = await asyncio.wait_for(shard.fetch_async(http), self.shard_timeout)
+        except asyncio.TimeoutError:
+            self._failed(shard, 'timeout', self._timeout_error(True), started)
+            raise
+        except Exception as e:
+            self._failed(shard, 'failed', e, started)
+            raise
+        self._succeeded(shard, result, started)
+        return result
+
+    async def _fetch_async(self, shards, run_started):
+        """Fetch shards as tasks on one event loop sharing one AsyncHTTP"""
+        http = AsyncHTTP()
+        tasks = {}
+        try:
+            for shard in self._by_trial(shards):
+                if not breakers[shard.kind].allow(shard.id):
+                    self._update(shard, state='circuit_open')
+                    continue
+                self._update(shard, state='queued', queued_at=run_started, started_at=None)
+                tasks[asyncio.ensure_future(self._run_shard_async(http, shard))] = shard
+            if not tasks:
+                return {}
+            remaining = max(0, self.run_timeout - (time.time() - run_started))
+            done, pending = await asyncio.wait(tasks, timeout=remaining)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in pending:
+                self._failed(tasks[task], 'timeout', self._timeout_error(False))
+            return {
+                tasks[task].id: task.result()
+                for task in done
+                if not task.cancelled() and task.exception() is None
+            }
+        finally:
+            await http.aclose()
+
+    def run(self):
+        """Fetch all shards and merge them into one snapshot"""
+        run_started = time.time()
+        shards = self.shards()
+        results = {}
+        to_fetch = []
+        for shard in shards:
+            if shard.id in self.cache:
+                results[shard.id] = self.cache[shard.id]
+                self._update(shard, state='cached', stale=False)
+            else:
+                to_fetch.append(shard)
+
+        if config.ASYNC_INGESTION:
+            results.update(run_async(self._fetch_async(to_fetch, run_started)))
+        else:
+            results.update(self._fetch_threads(to_fetch, run_started))
+
+        data = empty_data()
+        seen = {name: set() for name in COLLECTIONS}
+        for shard in shards:
+            result = results.get(shard.id)
+            if result is None:
+                result = breakers[shard.kind].recall(shard.id)
+                self._update(shard, stale=result is not None)
+            for name, records in (result or {}).items():
+                for record in records:
+                    # Overlapping Jira scopes can return the same issue
+                    if record['id'] not in seen[name]:
+                        seen[name].add(record['id'])
+                        data[name].append(record)
+        self.last_run = {
+            'started_at': run_started,
+            'duration': round(time.time() - run_started, 3),
+            'shards': len(shards),
+            'mode': 'async' if config.ASYNC_INGESTION else 'threads'
+        }
+        return data
+
+    def status(self):
+        with self._lock:
+            shards = [dict(entry, id=shard_id) for shard_id, entry in self.progress.items()]
+        states = {}
+        for entry in shards:
+            states[entry['state']] = states.get(entry['state'], 0) + 1
+        return {
+            'workers': self.workers,
+            'last_run': self.last_run,
+            'states': states,
+            'shards': shards
+        }
+
+
+ingestion = ShardedIngestion()
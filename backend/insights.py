@@ -0,0 +1,173 @@
+import operator
+from aggregates import ALL_TEAMS, aggregates
+from config import config
+from models import total_time
+from anomalies import anomaly_detector
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le
+}
+
+
+class InsightRule:
+    """Declarative threshold rule evaluated against derived team metrics"""
+
+    def __init__(self, name, metric, op, threshold, type, title, message, requires=None):
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.compare = OPERATORS[op]
+        self.threshold = threshold
+        self.type = type
+        self.title = title
+        self.message = message
+        # Metric that must be positive for the rule to apply
+        self.requires = requires
+
+    def evaluate(self, metrics, threshold):
+        if self.requires and not metrics[self.requires] > 0:
+            return None
+        value = metrics[self.metric]
+        if not self.compare(value, threshold):
+            return None
+        return {
+            'type': self.type,
+            'title': self.title,
+            'message': self.message.format(value=value, threshold=threshold),
+            'value': value
+        }
+
+
+def derive_metrics(aggregate):
+    """Turn raw per-team totals into the metrics rules are written against"""
+    time = aggregate['time']
+    total = total_time(aggregate)
+    development_time = time['user_stories'] + time['pull_requests']
+
+    def pct(value):
+        return (value / total) * 100 if total > 0 else 0
+
+    return {
+        'total_time': total,
+        'prod_support_pct': pct(time['prod_support']),
+        'prod_issues_pct': pct(time['prod_issues']),
+        'testing_pct': pct(time['testing']),
+        'dev_pct': pct(development_time),
+        'avg_pr_time': time['pull_requests'] / max(1, aggregate['count']['pull_requests'])
+    }
+
+
+class InsightEngine:
+    """Evaluates registered rules for every team once per snapshot.
+
+    Thresholds can be overridden per team through `config.INSIGHT_THRESHOLDS`,
+    a mapping of team name (or "*" for every team) to {rule name: threshold}.
+    """
+
+    def __init__(self, aggregates, thresholds=None):
+        self.aggregates = aggregates
+        self.rules = []
+        self.thresholds = thresholds if thresholds is not None else config.INSIGHT_THRESHOLDS
+        self.results = {}
+        self.version = None
+
+    def register(self, rule):
+        if any(existing.name == rule.name for existing in self.rules):
+            raise ValueError(f'Insight rule {rule.name!r} is already registered')
+        self.rules.append(rule)
+        return rule
+
+    def threshold_for(self, rule, team):
+        for key in (team, '*'):
+            overrides = self.thresholds.get(key) or {}
+            if rule.name in overrides:
+                return overrides[rule.name]
+        return rule.threshold
+
+    def evaluate(self, aggregate, team=ALL_TEAMS):
+        metrics = derive_metrics(aggregate)
+        insights = []
+        for rule in self.rules:
+            insight = rule.evaluate(metrics, self.threshold_for(rule, team))
+            if insight:
+                insights.append(insight)
+        return insights
+
+    def rebuild(self, store, change=None):
+        """Precompute insights for every team affected by a snapshot change.
+
+        Must be subscribed after the aggregates it reads from. Results are
+        built into a new dict and swapped in, so readers never see a team
+        without insights while the others are re-evaluated.
+        """
+        if change is None:
+            teams = list(self.aggregates.teams)
+            results = {}
+        else:
+            teams = {ALL_TEAMS}
+            for record in (change['old'], change['new']):
+                if record is not None:
+                    teams.add(record.get('team'))
+            results = dict(self.results)
+        for team in teams:
+            results[team] = self.evaluate(self.aggregates.team(team), team)
+        self.results = results
+        self.version = store.pending_version
+
+    def get(self, team=ALL_TEAMS):
+        return self.results.get(team, [])
+
+
+insight_engine = InsightEngine(aggregates)
+
+
+def team_insights(team=ALL_TEAMS):
+    """Rule-based insights followed by detected anomalies, as served by /api/insights and the stream"""
+    return insight_engine.get(team) + anomaly_detector.get(team)
+
+insight_engine.register(InsightRule(
+    name='high_prod_support',
+    metric='prod_support_pct', op='>', threshold=25,
+    type='warning',
+    title='High Production Support Time',
+    message='{value:.1f}% of time spent on production support. Consider improving monitoring and preventive measures.',
+    requires='total_time'
+))
+
+insight_engine.register(InsightRule(
+    name='excessive_prod_issues',
+    metric='prod_issues_pct', op='>', threshold=20,
+    type='critical',
+    title='Excessive Production Issues',
+    message='{value:.1f}% of time spent on production issues. This indicates quality concerns.',
+    requires='total_time'
+))
+
+insight_engine.register(InsightRule(
+    name='low_testing',
+    metric='testing_pct', op='<', threshold=15,
+    type='warning',
+    title='Low Testing Coverage',
+    message='Only {value:.1f}% of time spent on testing. Consider increasing test coverage.',
+    requires='total_time'
+))
+
+insight_engine.register(InsightRule(
+    name='good_dev_focus',
+    metric='dev_pct', op='>', threshold=50,
+    type='success',
+    title='Good Development Focus',
+    message='{value:.1f}% of time focused on development. Team is productive on new features.',
+    requires='total_time'
+))
+
+insight_engine.register(InsightRule(
+    name='long_pr_review',
+    metric='avg_pr_time', op='>', threshold=16,
+    type='warning',
+    title='Long PR Review Times',
+    message='Average PR takes {value:.1f} hours. Consider streamlining review process.'
+))
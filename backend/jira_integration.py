@@ -1,213 +1,222 @@
 from jira import JIRA
+from jira.resources import Issue
 from config import config
-from datetime import datetime, timedelta
-from cachetools import TTLCache
-import time
+from team_resolver import team_resolver
+from http_transport import http_transport
+from datetime import datetime
 
-cache = TTLCache(maxsize=100, ttl=config.CACHE_EXPIRY)
+# Collections populated from Jira issues
+JIRA_COLLECTIONS = ['user_stories', 'testing', 'prod_support', 'prod_issues']
+
+# JQL filter selecting each collection's issues; classify_issue applies the same rules locally
+JIRA_QUERIES = {
+    'user_stories': 'type in (Story, Task, Bug)',
+    'testing': '(type = Test OR labels in (testing, qa))',
+    'prod_support': '(type = "Support" OR labels in (support, customer))',
+    'prod_issues': '(labels in (production, prod) OR priority in (Critical, Blocker))'
+}
+
+# Only the fields the record mappers read
+JIRA_FIELDS = [
+    'summary', 'issuetype', 'status', 'assignee', 'reporter', 'priority', 'labels', 'components',
+    'created', 'resolutiondate', 'timespent', 'issuelinks', 'project',
+    'customfield_10016',  # story points
+    'customfield_10001',  # team
+    'customfield_10000'   # customer
+]
+
+# Latest issues kept per collection, and the search page size
+COLLECTION_LIMIT = 100
+PAGE_SIZE = 100
+
+def jira_scopes():
+    """JQL scopes to ingest: one per configured project key plus any custom JIRA_SCOPES"""
+    return [f'project = "{key}"' for key in config.JIRA_PROJECT_KEYS] + [f'({scope})' for scope in config.JIRA_SCOPES]
+
+def unified_jql(scope):
+    """One query matching the issues of every Jira collection of a scope, newest first"""
+    return f'{scope} AND ({" OR ".join(JIRA_QUERIES.values())}) ORDER BY created DESC'
+
+class IssueCollector:
+    """Classifies issues from a newest-first search into collection records.
+
+    Paging stops once every collection holds COLLECTION_LIMIT records, which
+    yields the same records the per-collection queries returned. Sparse
+    collections would otherwise page through the whole history, so once the
+    first collection is full only JIRA_EXTRA_PAGES more pages are read, and
+    never more than JIRA_MAX_ISSUES issues.
+    """
+    
+    def __init__(self, integration):
+        self.integration = integration
+        self.collections = {name: [] for name in JIRA_COLLECTIONS}
+        self.filled_at = None
+    
+    def add(self, issue):
+        for name in self.integration.classify_issue(issue):
+            if len(self.collections[name]) < COLLECTION_LIMIT:
+                self.collections[name].append(self.integration.mapper(name)(issue))
+    
+    def done(self, fetched):
+        if fetched >= config.JIRA_MAX_ISSUES:
+            return True
+        full = [len(records) >= COLLECTION_LIMIT for records in self.collections.values()]
+        if all(full):
+            return True
+        if any(full) and self.filled_at is None:
+            self.filled_at = fetched
+        return self.filled_at is not None and fetched - self.filled_at >= config.JIRA_EXTRA_PAGES * PAGE_SIZE
 
 class JiraIntegration:
     def __init__(self):
         if config.JIRA_URL and config.JIRA_API_TOKEN:
             self.jira = JIRA(
                 server=config.JIRA_URL,
-                basic_auth=(config.JIRA_EMAIL, config.JIRA_API_TOKEN)
+                basic_auth=(config.JIRA_EMAIL, config.JIRA_API_TOKEN),
+                # Retries are handled by the shared transport
+                max_retries=0
             )
+            http_transport.mount_on(self.jira._session)
             self.enabled = True
         else:
             self.jira = None
             self.enabled = False
     
-    def get_user_stories(self):
-        """Fetch user stories/issues from Jira"""
-        if not self.enabled:
-            return []
-        
-        cache_key = 'jira_stories'
-        if cache_key in cache:
-            return cache[cache_key]
-        
-        try:
-            # Search for issues in the project
-            jql = f'project = {config.JIRA_PROJECT_KEY} AND type in (Story, Task, Bug) ORDER BY created DESC'
-            issues = self.jira.search_issues(jql, maxResults=100, expand='changelog')
-            
-            stories = []
+    def fetch_scope(self, scope):
+        """Every Jira collection for one JQL scope from a single paged search; errors propagate"""
+        collector = IssueCollector(self)
+        start = 0
+        while not collector.done(start):
+            issues = self.jira.search_issues(
+                unified_jql(scope), startAt=start, maxResults=PAGE_SIZE, fields=JIRA_FIELDS
+            )
             for issue in issues:
-                # Get team from custom field or label
-                team = self._extract_team(issue)
-                
-                # Calculate time spent (in hours)
-                time_spent = 0
-                if issue.fields.timespent:
-                    time_spent = issue.fields.timespent / 3600  # Convert seconds to hours
-                
-                # Get story points
-                story_points = getattr(issue.fields, 'customfield_10016', 0) or 0  # Common story points field
-                
-                story = {
-                    'id': issue.key,
-                    'title': issue.fields.summary,
-                    'type': str(issue.fields.issuetype),
-                    'status': str(issue.fields.status),
-                    'assignee': str(issue.fields.assignee) if issue.fields.assignee else 'Unassigned',
-                    'team': team,
-                    'created_date': issue.fields.created[:10],
-                    'time_spent': time_spent,
-                    'story_points': story_points,
-                    'priority': str(issue.fields.priority) if issue.fields.priority else 'Medium'
-                }
-                stories.append(story)
-            
-            cache[cache_key] = stories
-            return stories
-            
-        except Exception as e:
-            return []
+                collector.add(issue)
+            start += len(issues)
+            if len(issues) < PAGE_SIZE or start >= issues.total:
+                break
+        return collector.collections
     
-    def get_testing_activities(self):
-        """Fetch testing-related issues from Jira"""
-        if not self.enabled:
-            return []
-        
-        cache_key = 'jira_testing'
-        if cache_key in cache:
-            return cache[cache_key]
-        
-        try:
-            # Search for test-related issues
-            jql = f'project = {config.JIRA_PROJECT_KEY} AND (type = Test OR labels in (testing, qa)) ORDER BY created DESC'
-            issues = self.jira.search_issues(jql, maxResults=100)
-            
-            tests = []
-            for issue in issues:
-                team = self._extract_team(issue)
-                
-                time_spent = 0
-                if issue.fields.timespent:
-                    time_spent = issue.fields.timespent / 3600
-                
-                test = {
-                    'id': issue.key,
-                    'type': 'Manual Test' if 'manual' in str(issue.fields.summary).lower() else 'Automated Test',
-                    'description': issue.fields.summary,
-                    'status': 'Passed' if str(issue.fields.status) == 'Done' else 'Failed' if str(issue.fields.status) == 'Failed' else 'In Progress',
-                    'tester': str(issue.fields.assignee) if issue.fields.assignee else 'Unassigned',
-                    'team': team,
-                    'date': issue.fields.created[:10],
-                    'time_spent': time_spent,
-                    'test_cases': 1,
-                    'bugs_found': self._count_linked_bugs(issue)
-                }
-                tests.append(test)
-            
-            cache[cache_key] = tests
-            return tests
-            
-        except Exception as e:
-            return []
+    def _time_spent(self, issue):
+        """Logged time on an issue in hours"""
+        if issue.fields.timespent:
+            return issue.fields.timespent / 3600  # Convert seconds to hours
+        return 0
     
-    def get_production_issues(self):
-        """Fetch production issues from Jira"""
-        if not self.enabled:
-            return []
-        
-        cache_key = 'jira_prod_issues'
-        if cache_key in cache:
-            return cache[cache_key]
+    def _map_story(self, issue):
+        """Map a Jira issue to a user story record"""
+        # Get story points
+        story_points = getattr(issue.fields, 'customfield_10016', 0) or 0  # Common story points field
         
-        try:
-            # Search for production issues
-            jql = f'project = {config.JIRA_PROJECT_KEY} AND (labels in (production, prod) OR priority in (Critical, Blocker)) ORDER BY created DESC'
-            issues = self.jira.search_issues(jql, maxResults=100)
-            
-            prod_issues = []
-            for issue in issues:
-                team = self._extract_team(issue)
-                
-                time_spent = 0
-                if issue.fields.timespent:
-                    time_spent = issue.fields.timespent / 3600
-                
-                # Calculate resolution time
-                resolution_time = None
-                if issue.fields.resolutiondate and issue.fields.created:
-                    created = datetime.fromisoformat(issue.fields.created.replace('Z', '+00:00'))
-                    resolved = datetime.fromisoformat(issue.fields.resolutiondate.replace('Z', '+00:00'))
-                    resolution_time = (resolved - created).total_seconds() / 3600
-                
-                prod_issue = {
-                    'id': issue.key,
-                    'title': issue.fields.summary,
-                    'severity': str(issue.fields.priority) if issue.fields.priority else 'Medium',
-                    'status': str(issue.fields.status),
-                    'reported_by': str(issue.fields.reporter) if issue.fields.reporter else 'Unknown',
-                    'assignee': str(issue.fields.assignee) if issue.fields.assignee else 'Unassigned',
-                    'team': team,
-                    'reported_date': issue.fields.created[:10],
-                    'time_spent': time_spent,
-                    'resolution_time': resolution_time,
-                    'impact': str(issue.fields.priority) if issue.fields.priority else 'Medium',
-                    'affected_users': 0  # Would need custom field
-                }
-                prod_issues.append(prod_issue)
-            
-            cache[cache_key] = prod_issues
-            return prod_issues
-            
-        except Exception as e:
-            return []
+        return {
+            'id': issue.key,
+            'title': issue.fields.summary,
+            'type': str(issue.fields.issuetype),
+            'status': str(issue.fields.status),
+            'assignee': str(issue.fields.assignee) if issue.fields.assignee else 'Unassigned',
+            'team': self._extract_team(issue),
+            'created_date': issue.fields.created[:10],
+            'time_spent': self._time_spent(issue),
+            'story_points': story_points,
+            'priority': str(issue.fields.priority) if issue.fields.priority else 'Medium'
+        }
+    
+    def _map_test(self, issue):
+        """Map a Jira issue to a testing activity record"""
+        return {
+            'id': issue.key,
+            'type': 'Manual Test' if 'manual' in str(issue.fields.summary).lower() else 'Automated Test',
+            'description': issue.fields.summary,
+            'status': 'Passed' if str(issue.fields.status) == 'Done' else 'Failed' if str(issue.fields.status) == 'Failed' else 'In Progress',
+            'tester': str(issue.fields.assignee) if issue.fields.assignee else 'Unassigned',
+            'team': self._extract_team(issue),
+            'date': issue.fields.created[:10],
+            'time_spent': self._time_spent(issue),
+            'test_cases': 1,
+            'bugs_found': self._count_linked_bugs(issue)
+        }
     
-    def get_support_tickets(self):
-        """Fetch support tickets from Jira"""
-        if not self.enabled:
-            return []
+    def _map_prod_issue(self, issue):
+        """Map a Jira issue to a production issue record"""
+        # Calculate resolution time
+        resolution_time = None
+        if issue.fields.resolutiondate and issue.fields.created:
+            created = datetime.fromisoformat(issue.fields.created.replace('Z', '+00:00'))
+            resolved = datetime.fromisoformat(issue.fields.resolutiondate.replace('Z', '+00:00'))
+            resolution_time = (resolved - created).total_seconds() / 3600
         
-        cache_key = 'jira_support'
-        if cache_key in cache:
-            return cache[cache_key]
+        return {
+            'id': issue.key,
+            'title': issue.fields.summary,
+            'severity': str(issue.fields.priority) if issue.fields.priority else 'Medium',
+            'status': str(issue.fields.status),
+            'reported_by': str(issue.fields.reporter) if issue.fields.reporter else 'Unknown',
+            'assignee': str(issue.fields.assignee) if issue.fields.assignee else 'Unassigned',
+            'team': self._extract_team(issue),
+            'reported_date': issue.fields.created[:10],
+            'time_spent': self._time_spent(issue),
+            'resolution_time': resolution_time,
+            'impact': str(issue.fields.priority) if issue.fields.priority else 'Medium',
+            'affected_users': 0  # Would need custom field
+        }
+    
+    def _map_support_ticket(self, issue):
+        """Map a Jira issue to a support ticket record"""
+        return {
+            'id': issue.key,
+            'type': 'User Query',
+            'description': issue.fields.summary,
+            'status': str(issue.fields.status),
+            'assignee': str(issue.fields.assignee) if issue.fields.assignee else 'Unassigned',
+            'team': self._extract_team(issue),
+            'date': issue.fields.created[:10],
+            'time_spent': self._time_spent(issue),
+            'priority': str(issue.fields.priority) if issue.fields.priority else 'Medium',
+            'customer': getattr(issue.fields, 'customfield_10000', 'Unknown')  # Customer field
+        }
+    
+    def classify_issue(self, issue):
+        """Return the collections an issue belongs to, mirroring the JQL of each fetch"""
+        issue_type = str(issue.fields.issuetype).lower()
+        priority = str(issue.fields.priority).lower() if issue.fields.priority else ''
+        labels = set(issue.fields.labels or [])
         
-        try:
-            # Search for support tickets
-            jql = f'project = {config.JIRA_PROJECT_KEY} AND (type = "Support" OR labels in (support, customer)) ORDER BY created DESC'
-            issues = self.jira.search_issues(jql, maxResults=100)
-            
-            tickets = []
-            for issue in issues:
-                team = self._extract_team(issue)
-                
-                time_spent = 0
-                if issue.fields.timespent:
-                    time_spent = issue.fields.timespent / 3600
-                
-                ticket = {
-                    'id': issue.key,
-                    'type': 'User Query',
-                    'description': issue.fields.summary,
-                    'status': str(issue.fields.status),
-                    'assignee': str(issue.fields.assignee) if issue.fields.assignee else 'Unassigned',
-                    'team': team,
-                    'date': issue.fields.created[:10],
-                    'time_spent': time_spent,
-                    'priority': str(issue.fields.priority) if issue.fields.priority else 'Medium',
-                    'customer': getattr(issue.fields, 'customfield_10000', 'Unknown')  # Customer field
-                }
-                tickets.append(ticket)
-            
-            cache[cache_key] = tickets
-            return tickets
-            
-        except Exception as e:
-            return []
+        collections = []
+        if issue_type in ('story', 'task', 'bug'):
+            collections.append('user_stories')
+        if issue_type == 'test' or labels & {'testing', 'qa'}:
+            collections.append('testing')
+        if issue_type == 'support' or labels & {'support', 'customer'}:
+            collections.append('prod_support')
+        if labels & {'production', 'prod'} or priority in ('critical', 'blocker'):
+            collections.append('prod_issues')
+        return collections
+    
+    def mapper(self, name):
+        """Record mapper for a Jira collection"""
+        return {
+            'user_stories': self._map_story,
+            'testing': self._map_test,
+            'prod_support': self._map_support_ticket,
+            'prod_issues': self._map_prod_issue
+        }[name]
+    
+    def normalize_issue(self, issue):
+        """Map an issue to a record for every collection it belongs to"""
+        return {name: self.mapper(name)(issue) for name in self.classify_issue(issue)}
+    
+    def issue_from_raw(self, raw):
+        """Build an issue resource from REST/webhook JSON"""
+        options = self.jira._options if self.jira else {'server': config.JIRA_URL}
+        session = self.jira._session if self.jira else None
+        return Issue(options, session, raw=raw)
     
     def _extract_team(self, issue):
         """Extract team information from issue"""
         # Try to get team from labels
-        if issue.fields.labels:
-            for label in issue.fields.labels:
-                for team in config.TEAMS:
-                    if team.lower().replace(' ', '') in label.lower():
-                        return team
+        team = team_resolver.resolve(issue.fields.labels)
+        if team:
+            return team
         
         # Try to get team from custom field (adjust field ID as needed)
         team_field = getattr(issue.fields, 'customfield_10001', None)
@@ -216,13 +225,12 @@ class JiraIntegration:
         
         # Try to get team from component
         if issue.fields.components:
-            for component in issue.fields.components:
-                for team in config.TEAMS:
-                    if team.lower().replace(' ', '') in str(component).lower():
-                        return team
+            team = team_resolver.resolve([str(component) for component in issue.fields.components])
+            if team:
+                return team
         
         # Default to first team
-        return config.TEAMS[0] if config.TEAMS else 'Default Team'
+        return team_resolver.default_team
     
     def _count_linked_bugs(self, issue):
         """Count linked bugs for an issue"""
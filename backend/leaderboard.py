@@ -0,0 +1,95 @@
+import bisect
+import threading
+from aggregates import ALL_TEAMS, aggregates
+from models import MEMBER_FIELDS, member_stats
+
+# Member stats that can be ranked, highest first
+LEADERBOARD_METRICS = ('productivity_score', 'total_time', 'prs_merged')
+
+
+class Leaderboard:
+    """Member rankings per team (and for ALL_TEAMS), kept sorted as the snapshot changes.
+
+    Each ranking is a sorted list of (-value, member) keys, so a page of the
+    top members is a slice and a record change only moves the affected
+    member: one bisect to remove the old key and one to insert the new one.
+    Stat blocks are cached per (team, member) next to the rankings. Must be
+    subscribed after the aggregates it reads from.
+    """
+
+    def __init__(self, aggregates):
+        self.aggregates = aggregates
+        self.stats = {}
+        self.rankings = {}
+        self._lock = threading.Lock()
+
+    def update(self, store, change=None):
+        """SnapshotStore listener: rebuild on publish, re-rank affected members on record changes"""
+        with self._lock:
+            if change is None:
+                self.rebuild()
+                return
+            for record in (change['old'], change['new']):
+                if record is None:
+                    continue
+                member = record.get(MEMBER_FIELDS[change['collection']])
+                if member is None:
+                    continue
+                for team in {record.get('team'), ALL_TEAMS}:
+                    self._refresh(team, member)
+
+    def rebuild(self):
+        self.stats = {}
+        self.rankings = {}
+        for (team, member), bucket in self.aggregates.members.items():
+            if any(bucket['count'].values()):
+                self.stats[(team, member)] = member_stats(member, bucket)
+        for (team, member), stats in self.stats.items():
+            rankings = self._rankings(team)
+            for metric in LEADERBOARD_METRICS:
+                rankings[metric].append((-stats[metric], member))
+        for rankings in self.rankings.values():
+            for ranking in rankings.values():
+                ranking.sort()
+
+    def _rankings(self, team):
+        if team not in self.rankings:
+            self.rankings[team] = {metric: [] for metric in LEADERBOARD_METRICS}
+        return self.rankings[team]
+
+    def _refresh(self, team, member):
+        key = (team, member)
+        rankings = self._rankings(team)
+        previous = self.stats.pop(key, None)
+        if previous is not None:
+            for metric in LEADERBOARD_METRICS:
+                ranking = rankings[metric]
+                del ranking[bisect.bisect_left(ranking, (-previous[metric], member))]
+        bucket = self.aggregates.members.get(key)
+        if bucket is None or not any(bucket['count'].values()):
+            # Every record of the member was removed
+            return
+        stats = self.stats[key] = member_stats(member, bucket)
+        for metric in LEADERBOARD_METRICS:
+            bisect.insort(rankings[metric], (-stats[metric], member))
+
+    def top(self, metric, team=ALL_TEAMS, offset=0, limit=20):
+        """One page of members ranked by `metric`, with their stat blocks"""
+        with self._lock:
+            ranking = self.rankings.get(team, {}).get(metric, [])
+            page = ranking[offset:offset + limit]
+            members = [
+                dict(self.stats[(team, member)], rank=offset + position + 1)
+                for position, (_, member) in enumerate(page)
+            ]
+            return {
+                'metric': metric,
+                'team': team,
+                'total': len(ranking),
+                'offset': offset,
+                'limit': limit,
+                'members': members
+            }
+
+
+leaderboard = Leaderboard(aggregates)
@@ -1,10 +1,15 @@
 import json
 import os
+from datetime import datetime, timedelta
 from config import config
+from snapshot_format import SnapshotReader, load_json_streaming
 
 # Get the directory where this file is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MOCK_DATA_FILE = os.path.join(BASE_DIR, 'mock_data.json')
+# Columnar snapshot converted from MOCK_DATA_FILE (python snapshot_format.py mock_data.json mock_data.snap);
+# relative SNAPSHOT_FILE paths are resolved under the backend directory
+MOCK_SNAPSHOT_FILE = os.path.join(BASE_DIR, config.SNAPSHOT_FILE or 'mock_data.snap')
 
 # Team members
 TEAM_MEMBERS = [
@@ -16,62 +21,75 @@ TEAM_MEMBERS = [
     'Frank Wilson'
 ]
 
+# Activity collections making up a data snapshot
+COLLECTIONS = ['user_stories', 'pull_requests', 'testing', 'prod_support', 'prod_issues']
+
+# Field naming the team member responsible for a record, per collection
+MEMBER_FIELDS = {
+    'user_stories': 'assignee',
+    'pull_requests': 'author',
+    'testing': 'tester',
+    'prod_support': 'assignee',
+    'prod_issues': 'assignee'
+}
+
+# Field holding the activity date of a record, per collection
+DATE_FIELDS = {
+    'user_stories': 'created_date',
+    'pull_requests': 'created_date',
+    'testing': 'date',
+    'prod_support': 'date',
+    'prod_issues': 'reported_date'
+}
+
+# Trend category of each collection and the divisor applied to its time (story and PR time is spread over a week)
+TREND_CATEGORIES = {
+    'user_stories': ('development', 7),
+    'pull_requests': ('development', 7),
+    'testing': ('testing', 1),
+    'prod_support': ('prod_support', 1),
+    'prod_issues': ('prod_issues', 1)
+}
+
+# Productivity score points per (collection, status)
+SCORE_WEIGHTS = {
+    ('user_stories', 'Done'): 10,
+    ('pull_requests', 'Merged'): 8,
+    ('testing', 'Passed'): 5,
+    ('prod_support', 'Resolved'): 3,
+    ('prod_issues', 'Resolved'): 15
+}
+
+def empty_data():
+    """Return a snapshot with no records"""
+    return {name: [] for name in COLLECTIONS}
+
 def load_mock_data():
-    """Load mock data from JSON file"""
+    """Load mock data from the binary snapshot, falling back to the JSON file"""
+    if _snapshot_is_current():
+        try:
+            return SnapshotReader(MOCK_SNAPSHOT_FILE).as_data(COLLECTIONS)
+        except (OSError, ValueError):
+            pass
     try:
-        with open(MOCK_DATA_FILE, 'r') as f:
-            return json.load(f)
+        return load_json_streaming(MOCK_DATA_FILE, COLLECTIONS)
     except FileNotFoundError:
-        return {
-            'user_stories': [],
-            'pull_requests': [],
-            'testing': [],
-            'prod_support': [],
-            'prod_issues': []
-        }
+        return empty_data()
     except json.JSONDecodeError:
-        return {
-            'user_stories': [],
-            'pull_requests': [],
-            'testing': [],
-            'prod_support': [],
-            'prod_issues': []
-        }
+        return empty_data()
+
+def _snapshot_is_current():
+    """Use the snapshot only if it is at least as new as the JSON it came from"""
+    if not os.path.exists(MOCK_SNAPSHOT_FILE):
+        return False
+    if not os.path.exists(MOCK_DATA_FILE):
+        return True
+    return os.path.getmtime(MOCK_SNAPSHOT_FILE) >= os.path.getmtime(MOCK_DATA_FILE)
 
 def load_real_data():
-    """Load data from Jira, GitLab, and Confluence APIs"""
-    from jira_integration import jira_integration
-    from gitlab_integration import gitlab_integration
-    
-    data = {
-        'user_stories': [],
-        'pull_requests': [],
-        'testing': [],
-        'prod_support': [],
-        'prod_issues': []
-    }
-    
-    # Load user stories from Jira
-    if jira_integration.enabled:
-        data['user_stories'] = jira_integration.get_user_stories()
-    
-    # Load merge requests (pull requests) from GitLab
-    if gitlab_integration.enabled:
-        data['pull_requests'] = gitlab_integration.get_merge_requests()
-    
-    # Load testing activities from Jira
-    if jira_integration.enabled:
-        data['testing'] = jira_integration.get_testing_activities()
-    
-    # Load support tickets from Jira
-    if jira_integration.enabled:
-        data['prod_support'] = jira_integration.get_support_tickets()
-    
-    # Load production issues from Jira
-    if jira_integration.enabled:
-        data['prod_issues'] = jira_integration.get_production_issues()
-    
-    return data
+    """Load data from Jira and GitLab, one shard per Jira scope and GitLab project"""
+    from ingestion import ingestion
+    return ingestion.run()
 
 def generate_fake_data():
     """Load data from APIs or JSON file based on configuration"""
@@ -80,118 +98,100 @@ def generate_fake_data():
     else:
         return load_real_data()
 
-def get_productivity_metrics(data, team=None):
-    """Calculate overall productivity metrics"""
-    stories = data['user_stories']
-    prs = data['pull_requests']
-    tests = data['testing']
-    support = data['prod_support']
-    issues = data['prod_issues']
-    
-    if team:
-        stories = [s for s in stories if s.get('team') == team]
-        prs = [pr for pr in prs if pr.get('team') == team]
-        tests = [t for t in tests if t.get('team') == team]
-        support = [s for s in support if s.get('team') == team]
-        issues = [i for i in issues if i.get('team') == team]
-    
-    total_stories = len(stories)
-    completed_stories = len([s for s in stories if s['status'] == 'Done'])
-    total_prs = len(prs)
-    merged_prs = len([pr for pr in prs if pr['status'] == 'Merged'])
+def total_time(bucket):
+    """Total hours across all categories of an aggregates bucket"""
+    return sum(bucket['time'][name] for name in COLLECTIONS)
+
+def get_productivity_metrics(aggregates, team=None):
+    """Calculate overall productivity metrics from materialized aggregates"""
+    bucket = aggregates.team(team or None)
     
-    total_time = sum([
-        sum([s['time_spent'] for s in stories]),
-        sum([pr['time_spent'] for pr in prs]),
-        sum([t['time_spent'] for t in tests]),
-        sum([s['time_spent'] for s in support]),
-        sum([i['time_spent'] for i in issues])
-    ])
+    total_stories = bucket['count']['user_stories']
+    completed_stories = bucket['status']['user_stories']['Done']
+    total_prs = bucket['count']['pull_requests']
+    merged_prs = bucket['status']['pull_requests']['Merged']
+    issue_status = bucket['status']['prod_issues']
     
     return {
-        'total_time_spent': round(total_time, 1),
+        'total_time_spent': round(total_time(bucket), 1),
         'story_completion_rate': round((completed_stories / max(1, total_stories)) * 100, 1),
         'pr_merge_rate': round((merged_prs / max(1, total_prs)) * 100, 1),
         'total_stories': total_stories,
         'completed_stories': completed_stories,
         'total_prs': total_prs,
         'merged_prs': merged_prs,
-        'active_prod_issues': len([i for i in issues if i['status'] not in ['Resolved', 'Closed']]),
-        'critical_issues': len([i for i in issues if i['severity'] == 'Critical'])
+        'active_prod_issues': bucket['count']['prod_issues'] - issue_status['Resolved'] - issue_status['Closed'],
+        'critical_issues': bucket['critical']
     }
 
-def get_time_distribution(data, period='week', team=None):
-    """Calculate time distribution across activities"""
-    stories = data['user_stories']
-    prs = data['pull_requests']
-    tests = data['testing']
-    support = data['prod_support']
-    issues = data['prod_issues']
-    
-    if team:
-        stories = [s for s in stories if s.get('team') == team]
-        prs = [pr for pr in prs if pr.get('team') == team]
-        tests = [t for t in tests if t.get('team') == team]
-        support = [s for s in support if s.get('team') == team]
-        issues = [i for i in issues if i.get('team') == team]
+def get_time_distribution(aggregates, period='week', team=None):
+    """Calculate time distribution across activities from materialized aggregates"""
+    time = aggregates.team(team or None)['time']
     
     return {
         'development': {
-            'user_stories': round(sum([s['time_spent'] for s in stories]), 1),
-            'pull_requests': round(sum([pr['time_spent'] for pr in prs]), 1)
+            'user_stories': round(time['user_stories'], 1),
+            'pull_requests': round(time['pull_requests'], 1)
         },
-        'testing': round(sum([t['time_spent'] for t in tests]), 1),
-        'prod_support': round(sum([s['time_spent'] for s in support]), 1),
-        'prod_issues': round(sum([i['time_spent'] for i in issues]), 1)
+        'testing': round(time['testing'], 1),
+        'prod_support': round(time['prod_support'], 1),
+        'prod_issues': round(time['prod_issues'], 1)
     }
 
-def get_team_performance(data, team=None):
-    """Calculate team member performance"""
-    stories = data['user_stories']
-    prs = data['pull_requests']
-    tests = data['testing']
-    support = data['prod_support']
-    issues = data['prod_issues']
-    
-    if team:
-        stories = [s for s in stories if s.get('team') == team]
-        prs = [pr for pr in prs if pr.get('team') == team]
-        tests = [t for t in tests if t.get('team') == team]
-        support = [s for s in support if s.get('team') == team]
-        issues = [i for i in issues if i.get('team') == team]
+def member_stats(member, bucket):
+    """Performance stat block of one member from their aggregate bucket"""
+    status = bucket['status']
+    total = total_time(bucket)
     
+    return {
+        'name': member,
+        'total_time': round(total, 1),
+        'stories_completed': status['user_stories']['Done'],
+        'prs_merged': status['pull_requests']['Merged'],
+        'tests_done': bucket['count']['testing'],
+        'support_tickets': bucket['count']['prod_support'],
+        'issues_resolved': status['prod_issues']['Resolved'],
+        'productivity_score': round(bucket['score_points'] / max(1, total), 2)
+    }
+
+def get_team_performance(aggregates, team=None):
+    """Calculate team member performance from materialized aggregates"""
     team_stats = {}
     
     for member in TEAM_MEMBERS:
-        member_stories = [s for s in stories if s['assignee'] == member]
-        member_prs = [pr for pr in prs if pr['author'] == member]
-        member_tests = [t for t in tests if t['tester'] == member]
-        member_support = [s for s in support if s['assignee'] == member]
-        member_issues = [i for i in issues if i['assignee'] == member]
-        
-        total_time = sum([
-            sum([s['time_spent'] for s in member_stories]),
-            sum([pr['time_spent'] for pr in member_prs]),
-            sum([t['time_spent'] for t in member_tests]),
-            sum([s['time_spent'] for s in member_support]),
-            sum([i['time_spent'] for i in member_issues])
-        ])
-        
-        team_stats[member] = {
-            'name': member,
-            'total_time': round(total_time, 1),
-            'stories_completed': len([s for s in member_stories if s['status'] == 'Done']),
-            'prs_merged': len([pr for pr in member_prs if pr['status'] == 'Merged']),
-            'tests_done': len(member_tests),
-            'support_tickets': len(member_support),
-            'issues_resolved': len([i for i in member_issues if i['status'] == 'Resolved']),
-            'productivity_score': round((
-                len([s for s in member_stories if s['status'] == 'Done']) * 10 +
-                len([pr for pr in member_prs if pr['status'] == 'Merged']) * 8 +
-                len([t for t in member_tests if t['status'] == 'Passed']) * 5 +
-                len([s for s in member_support if s['status'] == 'Resolved']) * 3 +
-                len([i for i in member_issues if i['status'] == 'Resolved']) * 15
-            ) / max(1, total_time), 2)
-        }
+        team_stats[member] = member_stats(member, aggregates.member(member, team or None))
     
     return list(team_stats.values())
+
+def get_trends(data, days=30, team=None, retention=None):
+    """Calculate daily time per activity over the last `days` days, including compacted days"""
+    trends = {}
+    base_date = datetime.now() - timedelta(days=days)
+    
+    for i in range(days):
+        date = (base_date + timedelta(days=i)).strftime('%Y-%m-%d')
+        trends[date] = {
+            'development': 0,
+            'testing': 0,
+            'prod_support': 0,
+            'prod_issues': 0
+        }
+    
+    for name in COLLECTIONS:
+        category, divisor = TREND_CATEGORIES[name]
+        field = DATE_FIELDS[name]
+        for record in data[name]:
+            if team and record.get('team') != team:
+                continue
+            date = record[field]
+            if date in trends:
+                trends[date][category] += record['time_spent'] / divisor
+        if retention:
+            for date, time_spent in retention.daily_time(name, team or None).items():
+                if date in trends:
+                    trends[date][category] += time_spent / divisor
+    
+    return {
+        'dates': list(trends.keys()),
+        'data': trends
+    }
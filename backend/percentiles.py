@@ -0,0 +1,100 @@
+import threading
+from models import MEMBER_FIELDS
+from sketches import QuantileSketch
+
+# Metric name -> (collection, record field) tracked with quantile sketches
+PERCENTILE_METRICS = {
+    'pr_cycle_time': ('pull_requests', 'time_spent'),
+    'resolution_time': ('prod_issues', 'resolution_time'),
+    'story_time': ('user_stories', 'time_spent')
+}
+
+
+class PercentileIndex:
+    """Quantile sketches per team and per (team, member), kept in sync with the SnapshotStore.
+
+    Only per-team sketches are stored; any combination of teams (including
+    all of them) is answered by merging, so memory does not grow with the
+    number of team subsets queried.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.teams = {}
+        self.members = {}
+        self._lock = threading.Lock()
+
+    def _sketches(self, table, key):
+        if key not in table:
+            table[key] = {
+                metric: QuantileSketch(self.relative_accuracy) for metric in PERCENTILE_METRICS
+            }
+        return table[key]
+
+    def update(self, store, change=None):
+        """SnapshotStore listener: rebuild on publish, adjust on record changes"""
+        with self._lock:
+            if change is None:
+                self.teams = {}
+                self.members = {}
+                for metric, (collection, _) in PERCENTILE_METRICS.items():
+                    for record in store.data[collection]:
+                        self._apply(metric, record, 1)
+                return
+            for metric, (collection, _) in PERCENTILE_METRICS.items():
+                if collection != change['collection']:
+                    continue
+                if change['old'] is not None:
+                    self._apply(metric, change['old'], -1)
+                if change['new'] is not None:
+                    self._apply(metric, change['new'], 1)
+
+    def _apply(self, metric, record, weight):
+        collection, field = PERCENTILE_METRICS[metric]
+        value = record.get(field)
+        if value is None:
+            return
+        team = record.get('team')
+        self._sketches(self.teams, team)[metric].add(value, weight)
+        member = record.get(MEMBER_FIELDS[collection])
+        if member is not None:
+            self._sketches(self.members, (team, member))[metric].add(value, weight)
+
+    def _merged(self, sketch_sets):
+        merged = {metric: QuantileSketch(self.relative_accuracy) for metric in PERCENTILE_METRICS}
+        for sketches in sketch_sets:
+            for metric, sketch in sketches.items():
+                merged[metric].merge(sketch)
+        return merged
+
+    def summary(self, teams=None, member=None):
+        """p50/p90/p99 per metric for the given teams (None = all teams), optionally one member"""
+        with self._lock:
+            if member is not None:
+                sketch_sets = [
+                    sketches for (team, name), sketches in self.members.items()
+                    if name == member and (teams is None or team in teams)
+                ]
+            else:
+                sketch_sets = [
+                    sketches for team, sketches in self.teams.items()
+                    if teams is None or team in teams
+                ]
+            merged = self._merged(sketch_sets)
+        return {metric: sketch.summary() for metric, sketch in merged.items()}
+
+    def member_summaries(self, teams=None):
+        """Percentile summary for every member in the given teams"""
+        with self._lock:
+            by_member = {}
+            for (team, name), sketches in self.members.items():
+                if teams is None or team in teams:
+                    by_member.setdefault(name, []).append(sketches)
+            merged = {name: self._merged(sketch_sets) for name, sketch_sets in by_member.items()}
+        return {
+            name: {metric: sketch.summary() for metric, sketch in sketches.items()}
+            for name, sketches in sorted(merged.items())
+        }
+
+
+percentile_index = PercentileIndex()
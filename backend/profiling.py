@@ -0,0 +1,222 @@
+import cProfile
+import functools
+import inspect
+import marshal
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from fastapi.routing import APIRoute
+from config import config
+
+# Profiler attached to the request currently being handled (if any)
+_active_profile = ContextVar('active_profile', default=None)
+
+
+class ProfileStore:
+    """Bounded in-memory store of captured request profiles"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile_id, method, path, duration, profile):
+        """Serialize a finished profile and keep it for download"""
+        profile.create_stats()
+        entry = {
+            'id': profile_id,
+            'method': method,
+            'path': path,
+            'duration_ms': round(duration * 1000, 2),
+            'captured_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            # Same layout as cProfile.Profile.dump_stats, readable by pstats/snakeviz
+            'stats': marshal.dumps(profile.stats)
+        }
+        with self._lock:
+            self._profiles[profile_id] = entry
+            while len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return [
+                {k: v for k, v in entry.items() if k != 'stats'}
+                for entry in reversed(self._profiles.values())
+            ]
+
+
+class ProfilingMiddleware:
+    """ASGI middleware enabling per-request profiling by header or sampling"""
+
+    def __init__(self, app, store, header=None, sample_rate=None):
+        self.app = app
+        self.store = store
+        self.header = (header or config.PROFILE_HEADER).lower().encode()
+        self.sample_rate = config.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def _should_profile(self, scope):
+        if scope['type'] != 'http' or not scope['path'].startswith('/api/'):
+            return False
+        if scope['path'].startswith('/api/profiles'):
+            return False
+        for name, value in scope.get('headers', []):
+            if name == self.header and value.lower() in (b'1', b'true', b'yes'):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = cProfile.Profile()
+        token = _active_profile.set(profile)
+        profile_id = uuid.uuid4().hex[:12]
+        started = time.perf_counter()
+
+        async def send_with_profile_id(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((b'x-profile-id', profile_id.encode()))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _active_profile.reset(token)
+            duration = time.perf_counter() - started
+            self.store.add(profile_id, scope['method'], scope['path'], duration, profile)
+
+
+def profiled(endpoint):
+    """Run an endpoint under the request's profiler when one is active.
+
+    Sync endpoints execute in the threadpool, where a profiler enabled by the
+    middleware on the event loop thread would not see them, so the profiler
+    is enabled around the handler call itself.
+    """
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _active_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            profile.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.disable()
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _active_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        profile.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.disable()
+    return wrapper
+
+
+class ProfilingRoute(APIRoute):
+    """Route class that wraps every endpoint with `profiled`"""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, profiled(endpoint), **kwargs)
+
+
+class SamplingProfiler:
+    """Low-overhead statistical profiler for the whole process.
+
+    A daemon thread periodically snapshots the stacks of all other threads and
+    counts them in collapsed ("folded") form, the input format used by
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=None, max_stacks=10000):
+        self.interval = interval or config.PROFILE_SAMPLING_INTERVAL
+        self.max_stacks = max_stacks
+        self.samples = Counter()
+        self.total_samples = 0
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.total_samples = 0
+            self.started_at = time.time()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    stack = self._collapse(frame)
+                    if stack in self.samples or len(self.samples) < self.max_stacks:
+                        self.samples[stack] += 1
+                    else:
+                        self.samples['[truncated]'] += 1
+                self.total_samples += 1
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def folded(self):
+        """Return collected samples as folded stack lines"""
+        with self._lock:
+            return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common()) + '\n'
+
+    def status(self):
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'samples': self.total_samples,
+            'unique_stacks': len(self.samples),
+            'started_at': self.started_at
+        }
+
+
+profile_store = ProfileStore(maxsize=config.PROFILE_MAX_STORED)
+sampling_profiler = SamplingProfiler()
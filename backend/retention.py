@@ -0,0 +1,99 @@
+import threading
+from datetime import date, timedelta
+from aggregates import ALL_TEAMS, Aggregates
+from config import config
+from models import COLLECTIONS, DATE_FIELDS
+
+
+class Retention:
+    """Keeps raw records for the last `days` days and compacts older ones.
+
+    Records dated before the cutoff are dropped from the snapshot and folded
+    into the same team and member buckets the live aggregates use, plus
+    per-team daily time per collection for trends. Each compaction seals the
+    days before its cutoff: records of a sealed day that show up again (the
+    integrations keep returning their latest records) were already counted
+    and are dropped without being folded a second time.
+    """
+
+    def __init__(self, days=None, compact_interval=None):
+        self.days = days or config.RAW_RETENTION_DAYS
+        self.compact_interval = compact_interval or config.RETENTION_COMPACT_INTERVAL
+        self.aggregates = Aggregates()
+        self.daily = {}
+        self.sealed = None
+        self.compacted = 0
+        self.last_compaction = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def cutoff(self, today=None):
+        return ((today or date.today()) - timedelta(days=self.days)).isoformat()
+
+    def due(self, today=None):
+        """Whether the window has moved since the last compaction"""
+        return self.sealed is None or self.cutoff(today) > self.sealed
+
+    def is_compacted(self, collection, record):
+        """Whether a record belongs to a sealed day and must not be kept raw"""
+        day = record.get(DATE_FIELDS[collection])
+        return self.sealed is not None and day is not None and day < self.sealed
+
+    def compact(self, data, today=None):
+        """The snapshot without records older than the window; those are folded in first"""
+        # Never move back into days that are already sealed
+        cutoff = max(self.cutoff(today), self.sealed or '')
+        kept = {}
+        for name in COLLECTIONS:
+            field = DATE_FIELDS[name]
+            records = []
+            for record in data[name]:
+                day = record.get(field)
+                if day is None or day >= cutoff:
+                    records.append(record)
+                elif self.sealed is None or day >= self.sealed:
+                    self._fold(name, record, day)
+            # Untouched collections keep their original (possibly memory-mapped) sequence
+            kept[name] = records if len(records) != len(data[name]) else data[name]
+        self.sealed = cutoff
+        self.last_compaction = date.today().isoformat()
+        return kept
+
+    def _fold(self, collection, record, day):
+        self.aggregates._apply(collection, record, 1)
+        for team in {record.get('team'), ALL_TEAMS}:
+            days = self.daily.setdefault(team, {}).setdefault(collection, {})
+            days[day] = days.get(day, 0) + record['time_spent']
+        self.compacted += 1
+
+    def daily_time(self, collection, team=ALL_TEAMS):
+        """{day: hours} of compacted records of one collection"""
+        return self.daily.get(team, {}).get(collection, {})
+
+    def start(self, store):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, args=(store,), name='retention', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, store):
+        while not self._stop.wait(self.compact_interval):
+            try:
+                if self.due():
+                    store.compact()
+            except Exception:
+                pass
+
+    def status(self):
+        return {
+            'days': self.days,
+            'compacted_before': self.sealed,
+            'compacted_records': self.compacted,
+            'last_compaction': self.last_compaction
+        }
+
+
+retention = Retention() if config.RAW_RETENTION_DAYS else None
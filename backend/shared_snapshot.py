@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+from config import config
+from models import COLLECTIONS
+from snapshot_format import SnapshotReader, write_snapshot
+
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = 'leader.lock'
+
+
+class SharedSnapshot:
+    """Shares one data snapshot between all uvicorn workers on a host.
+
+    Whichever worker holds an exclusive lock on `leader.lock` builds the
+    snapshot, writes it in the columnar snapshot format and atomically points
+    `CURRENT` at the new version. Every worker, the leader included, serves
+    data straight from the memory-mapped file, so the dataset lives once in
+    the page cache and upstream APIs are queried by one process only. If the
+    leader exits, its lock is released and the next worker to poll takes over.
+    Record-level changes (webhooks) are appended to a per-version journal that
+    every worker replays, until the next full snapshot supersedes them.
+    Requires a POSIX platform (uses fcntl locks).
+    """
+
+    def __init__(self, directory, store, build, refresh_interval=None, poll_interval=None, keep=3):
+        self.directory = directory
+        self.store = store
+        self.build = build
+        self.refresh_interval = refresh_interval or config.SNAPSHOT_REFRESH_INTERVAL
+        self.poll_interval = poll_interval or config.SNAPSHOT_POLL_INTERVAL
+        self.keep = keep
+        self.version = 0
+        self.is_leader = False
+        self.last_built = None
+        self._lock_fd = None
+        self._current_mtime = None
+        self._journal_offset = 0
+        self._journal_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _try_become_leader(self):
+        import fcntl
+        if self.is_leader:
+            return True
+        fd = os.open(self._path(LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        self.is_leader = True
+        return True
+
+    def _read_current(self):
+        try:
+            with open(self._path(CURRENT_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_atomic(self, name, write):
+        tmp_path = self._path(f'.{name}.{os.getpid()}.tmp')
+        write(tmp_path)
+        os.replace(tmp_path, self._path(name))
+
+    def publish_new_version(self):
+        """Build a fresh snapshot and hand it off to all workers (leader only)"""
+        data = self.build()
+        current = self._read_current()
+        version = (current['version'] if current else 0) + 1
+        file_name = f'snapshot-{version:08d}.snap'
+        self._write_atomic(file_name, lambda path: write_snapshot(
+            ((name, data[name]) for name in COLLECTIONS), path
+        ))
+
+        def write_pointer(path):
+            with open(path, 'w') as f:
+                json.dump({'version': version, 'file': file_name, 'published_at': time.time()}, f)
+        self._write_atomic(CURRENT_FILE, write_pointer)
+
+        self.last_built = time.time()
+        self._remove_old_versions(version)
+        self.load_current()
+
+    def _remove_old_versions(self, version):
+        # Workers still mapping an unlinked file keep reading it until they switch
+        for name in os.listdir(self.directory):
+            for prefix, suffix in (('snapshot-', '.snap'), ('deltas-', '.jsonl')):
+                if name.startswith(prefix) and name.endswith(suffix):
+                    file_version = int(name[len(prefix):-len(suffix)])
+                    if file_version <= version - self.keep:
+                        os.remove(self._path(name))
+
+    def load_current(self):
+        """Map the snapshot named by CURRENT if it is newer than ours"""
+        try:
+            self._current_mtime = os.stat(self._path(CURRENT_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        current = self._read_current()
+        if not current or current['version'] <= self.version:
+            return False
+        reader = SnapshotReader(self._path(current['file']))
+        with self._journal_lock:
+            self.version = current['version']
+            self._journal_offset = 0
+            self.store.publish(reader.as_data(COLLECTIONS))
+        self.sync_journal()
+        return True
+
+    def _journal_path(self, version):
+        return self._path(f'deltas-{version:08d}.jsonl')
+
+    def apply(self, changes):
+        """Journal record changes for every worker, then apply them locally"""
+        if self._current_changed():
+            self.load_current()
+        line = (json.dumps(changes) + '\n').encode('utf-8')
+        # O_APPEND keeps concurrent single-write appends from interleaving
+        fd = os.open(self._journal_path(self.version), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        self.sync_journal()
+
+    def sync_journal(self):
+        """Apply journal entries for the current version not yet seen here"""
+        with self._journal_lock:
+            try:
+                with open(self._journal_path(self.version), 'rb') as f:
+                    f.seek(self._journal_offset)
+                    pending = f.read()
+            except FileNotFoundError:
+                return
+            complete = pending[:pending.rfind(b'\n') + 1]
+            self._journal_offset += len(complete)
+            for line in complete.splitlines():
+                self.store.apply([tuple(change) for change in json.loads(line)])
+
+    def _current_changed(self):
+        try:
+            return os.stat(self._path(CURRENT_FILE)).st_mtime_ns != self._current_mtime
+        except FileNotFoundError:
+            return False
+
+    def _leader_due(self):
+        current = self._read_current()
+        if current is None:
+            return True
+        last = self.last_built or current.get('published_at', 0)
+        return time.time() - last >= self.refresh_interval
+
+    def tick(self):
+        """One round of leader election, refresh and version pickup"""
+        if self._try_become_leader() and self._leader_due():
+            self.publish_new_version()
+        elif self._current_changed():
+            self.load_current()
+        else:
+            self.sync_journal()
+
+    def start(self, wait_timeout=60):
+        """Load the initial snapshot, then keep it current in the background"""
+        deadline = time.time() + wait_timeout
+        self.tick()
+        while self.version == 0 and time.time() < deadline:
+            time.sleep(min(self.poll_interval, 0.5))
+            self.tick()
+        self._thread = threading.Thread(target=self._run, name='shared-snapshot', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.tick()
+            except Exception:
+                # Keep serving the last mapped snapshot; retry on the next poll
+                continue
+
+    def status(self):
+        return {
+            'role': 'leader' if self.is_leader else 'follower',
+            'version': self.version,
+            'directory': self.directory,
+            'last_built': self.last_built
+        }
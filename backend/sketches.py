@@ -0,0 +1,91 @@
+import math
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch).
+
+    Values are counted in logarithmic buckets, so any quantile is returned
+    within `relative_accuracy` of the true value. Bucket counts can be
+    decremented, which makes removals exact, and two sketches merge by adding
+    counts. Memory is capped at `max_buckets`; past that the lowest buckets
+    are collapsed together, which only affects accuracy for the smallest values.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min_key = None
+
+    def _key(self, value):
+        key = math.ceil(math.log(value) / self.log_gamma)
+        if self.min_key is not None and key < self.min_key:
+            return self.min_key
+        return key
+
+    def add(self, value, weight=1):
+        """Count a value; a negative weight removes previously added values"""
+        if value is None:
+            return
+        self.count += weight
+        if value <= 0:
+            self.zero_count += weight
+            return
+        key = self._key(value)
+        count = self.buckets.get(key, 0) + weight
+        if count:
+            self.buckets[key] = count
+        else:
+            self.buckets.pop(key, None)
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def remove(self, value):
+        self.add(value, -1)
+
+    def _collapse(self):
+        keys = sorted(self.buckets)
+        excess = keys[:len(keys) - self.max_buckets + 1]
+        self.min_key = excess[-1]
+        self.buckets[self.min_key] = sum(self.buckets.pop(key) for key in excess[:-1]) + self.buckets[self.min_key]
+
+    def merge(self, other):
+        """Add another sketch's counts into this one"""
+        if other.gamma != self.gamma:
+            raise ValueError('Cannot merge sketches with different relative accuracy')
+        if other.min_key is not None and (self.min_key is None or other.min_key > self.min_key):
+            self.min_key = other.min_key
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for key, count in other.buckets.items():
+            if self.min_key is not None and key < self.min_key:
+                key = self.min_key
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        """Approximate nearest-rank q-quantile (0 <= q <= 1), or None when empty"""
+        if self.count <= 0:
+            return None
+        rank = max(0, math.ceil(q * self.count) - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)):
+        result = {'count': self.count}
+        for q in quantiles:
+            value = self.quantile(q)
+            result[f'p{round(q * 100):g}'] = round(value, 2) if value is not None else None
+        return result
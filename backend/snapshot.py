@@ -0,0 +1,121 @@
+import threading
+import time
+from models import empty_data
+from retention import retention
+
+
+class SnapshotStore:
+    """Holds the live data snapshot and notifies listeners when it changes.
+
+    Listeners are called as `listener(store, change)`. `change` is None when
+    the whole snapshot was replaced, otherwise a dict describing one record
+    change: {'op': 'upsert' | 'delete', 'collection', 'old', 'new'}.
+    With a retention policy, published snapshots only keep records inside its
+    window and upserts of records from already compacted days are ignored.
+    `version` only advances once every listener has run, so a reader never
+    pairs the new version with half-updated derived state; listeners label
+    what they build with `pending_version`.
+    """
+
+    def __init__(self, retention=None):
+        self.retention = retention
+        self.data = empty_data()
+        self.version = 0
+        self.pending_version = 0
+        self.updated_at = None
+        self._positions = {}
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    def subscribe(self, listener):
+        """Register a callable invoked after every change"""
+        self._listeners.append(listener)
+        return listener
+
+    def _notify(self, change):
+        self.pending_version = self.version + 1
+        try:
+            for listener in self._listeners:
+                listener(self, change)
+        finally:
+            self.version = self.pending_version
+            self.updated_at = time.time()
+
+    def current_version(self):
+        """The version, waiting for a change that is still reaching the listeners"""
+        with self._lock:
+            return self.version
+
+    def publish(self, data):
+        """Replace the current snapshot and run all listeners"""
+        with self._lock:
+            if self.retention:
+                data = self.retention.compact(data)
+            self.data = data
+            self._positions = {}
+            self._notify(None)
+
+    def compact(self):
+        """Republish the current snapshot so records that left the retention window are compacted"""
+        with self._lock:
+            self.publish(self.data)
+
+    def _records(self, collection):
+        """Return a mutable record list and its id -> position index"""
+        records = self.data[collection]
+        if not isinstance(records, list):
+            # Snapshots mapped from disk are read-only until first written
+            records = self.data[collection] = list(records)
+        if collection not in self._positions:
+            self._positions[collection] = {record['id']: i for i, record in enumerate(records)}
+        return records, self._positions[collection]
+
+    def get(self, collection, record_id):
+        with self._lock:
+            records, positions = self._records(collection)
+            position = positions.get(record_id)
+            return records[position] if position is not None else None
+
+    def upsert(self, collection, record):
+        """Insert or replace a record by id"""
+        with self._lock:
+            if self.retention and self.retention.is_compacted(collection, record):
+                # Its day is already folded into the compacted aggregates
+                return
+            records, positions = self._records(collection)
+            position = positions.get(record['id'])
+            if position is None:
+                old = None
+                positions[record['id']] = len(records)
+                records.append(record)
+            else:
+                old = records[position]
+                records[position] = record
+            self._notify({'op': 'upsert', 'collection': collection, 'old': old, 'new': record})
+
+    def delete(self, collection, record_id):
+        """Remove a record by id; returns False if it was not present"""
+        with self._lock:
+            records, positions = self._records(collection)
+            position = positions.pop(record_id, None)
+            if position is None:
+                return False
+            old = records[position]
+            # Copy on write so requests iterating the old list are unaffected
+            self.data[collection] = records[:position] + records[position + 1:]
+            for record in self.data[collection][position:]:
+                positions[record['id']] -= 1
+            self._notify({'op': 'delete', 'collection': collection, 'old': old, 'new': None})
+            return True
+
+    def apply(self, changes):
+        """Apply a list of ('upsert', collection, record) / ('delete', collection, id)"""
+        with self._lock:
+            for op, collection, payload in changes:
+                if op == 'upsert':
+                    self.upsert(collection, payload)
+                elif op == 'delete':
+                    self.delete(collection, payload)
+
+
+store = SnapshotStore(retention)
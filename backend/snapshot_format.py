@@ -0,0 +1,389 @@
+"""Compact columnar snapshot format for activity data.
+
+Layout of a snapshot file:
+
+    MAGIC (8 bytes) | header length (uint64 LE) | header JSON | column blobs
+
+The header describes every collection as a set of columns. Each column blob
+starts on an 8-byte boundary so numeric columns can be viewed in place via
+memoryview casts on the memory-mapped file; nothing is decoded until a row or
+column is actually read.
+
+Column kinds:
+    int    int64 values
+    float  float64 values
+    str    uint32 codes into a per-column string dictionary (uint64 offsets + UTF-8 bytes)
+    json   like str, but each dictionary entry is a JSON document
+
+An optional uint8 mask per column marks rows where the field is missing (0),
+null (1), a float (2) or an int (3), which keeps records byte-for-byte
+identical to the JSON they were converted from.
+"""
+import argparse
+import json
+import mmap
+import struct
+import sys
+from collections.abc import Sequence
+from itertools import groupby
+from operator import itemgetter
+
+MAGIC = b'PTSNAP01'
+FORMAT_VERSION = 1
+
+MISSING, NULL, FLOAT, INT = 0, 1, 2, 3
+
+# Range of the int column kind; larger integers are stored as json
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class ColumnBuilder:
+    """Accumulates the values of one field while a collection is converted"""
+
+    def __init__(self, rows_before=0):
+        self.values = [None] * rows_before
+        self.states = [MISSING] * rows_before
+
+    def append(self, value, state):
+        self.values.append(value)
+        self.states.append(state)
+
+    def encode(self):
+        """Return (kind, payload parts, mask bytes or None)"""
+        present = [v for v, s in zip(self.values, self.states) if s not in (MISSING, NULL)]
+        in_range = all(INT64_MIN <= v <= INT64_MAX for v in present if type(v) is int)
+        if present and in_range and all(type(v) is int for v in present):
+            kind = 'int'
+        elif present and in_range and all(type(v) in (int, float) for v in present):
+            kind = 'float'
+        elif all(type(v) is str for v in present):
+            kind = 'str'
+        else:
+            kind = 'json'
+
+        states = list(self.states)
+        if kind == 'float':
+            for i, value in enumerate(self.values):
+                if states[i] not in (MISSING, NULL):
+                    states[i] = INT if type(value) is int else FLOAT
+        irregular = (MISSING, NULL, INT) if kind == 'float' else (MISSING, NULL)
+        mask = bytes(states) if any(s in irregular for s in states) else None
+
+        if kind == 'int':
+            values = [v if s not in (MISSING, NULL) else 0 for v, s in zip(self.values, states)]
+            return kind, {'values': struct.pack(f'<{len(values)}q', *values)}, mask
+        if kind == 'float':
+            values = [float(v) if s not in (MISSING, NULL) else 0.0 for v, s in zip(self.values, states)]
+            return kind, {'values': struct.pack(f'<{len(values)}d', *values)}, mask
+
+        dictionary = {}
+        codes = []
+        for value, state in zip(self.values, states):
+            if state in (MISSING, NULL):
+                codes.append(0)
+                continue
+            key = value if kind == 'str' else json.dumps(value)
+            if key not in dictionary:
+                dictionary[key] = len(dictionary)
+            codes.append(dictionary[key])
+        encoded = [key.encode('utf-8') for key in dictionary]
+        offsets = [0]
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        return kind, {
+            'codes': struct.pack(f'<{len(codes)}I', *codes),
+            'offsets': struct.pack(f'<{len(offsets)}Q', *offsets),
+            'strings': b''.join(encoded)
+        }, mask
+
+
+def write_snapshot(collections, path):
+    """Write an iterable of (collection name, iterable of records) to `path`"""
+    header = {'version': FORMAT_VERSION, 'byteorder': 'little', 'collections': {}}
+    blobs = []
+
+    for name, records in collections:
+        columns = {}
+        rows = 0
+        for record in records:
+            if not isinstance(record, dict):
+                raise ValueError(
+                    f'Record {rows} of collection {name!r} is not a JSON object (got {type(record).__name__})'
+                )
+            for field in record:
+                if field not in columns:
+                    columns[field] = ColumnBuilder(rows)
+            for field, builder in columns.items():
+                if field not in record:
+                    builder.append(None, MISSING)
+                elif record[field] is None:
+                    builder.append(None, NULL)
+                else:
+                    builder.append(record[field], FLOAT)
+            rows += 1
+
+        collection_header = {'rows': rows, 'columns': {}}
+        for field, builder in columns.items():
+            kind, parts, mask = builder.encode()
+            if mask is not None:
+                parts['mask'] = mask
+            column_header = {'kind': kind}
+            for part, blob in parts.items():
+                column_header[part] = len(blobs)
+                blobs.append(blob)
+            collection_header['columns'][field] = column_header
+        header['collections'][name] = collection_header
+
+    # Blob references are indexes until the header size (and so offsets) is known
+    def resolve(header_size):
+        offset = _align(len(MAGIC) + 8 + header_size)
+        positions = []
+        for blob in blobs:
+            positions.append((offset, len(blob)))
+            offset = _align(offset + len(blob))
+        resolved = json.loads(json.dumps(header))
+        for collection in resolved['collections'].values():
+            for column in collection['columns'].values():
+                for part in ('values', 'codes', 'offsets', 'strings', 'mask'):
+                    if part in column:
+                        column[part] = list(positions[column[part]])
+        return positions, json.dumps(resolved).encode('utf-8')
+
+    header_size = len(json.dumps(header))
+    while True:
+        positions, header_bytes = resolve(header_size)
+        if len(header_bytes) <= header_size:
+            # JSON tolerates trailing whitespace, so pad up to the reserved size
+            header_bytes = header_bytes.ljust(header_size)
+            break
+        header_size = len(header_bytes)
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for blob, (offset, _) in zip(blobs, positions):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(blob)
+
+
+class Column:
+    """Read-only view of one column inside a mapped snapshot"""
+
+    def __init__(self, buffer, spec):
+        self.kind = spec['kind']
+
+        def view(part, fmt):
+            offset, length = spec[part]
+            return buffer[offset:offset + length].cast(fmt)
+
+        self.mask = view('mask', 'B') if 'mask' in spec else None
+        if self.kind in ('int', 'float'):
+            self.values = view('values', 'q' if self.kind == 'int' else 'd')
+        else:
+            self.values = view('codes', 'I')
+            self.offsets = view('offsets', 'Q')
+            offset, length = spec['strings']
+            self.strings = buffer[offset:offset + length]
+            self._decoded = {}
+
+    def get(self, row):
+        """Return (present, value) for a row"""
+        state = self.mask[row] if self.mask is not None else FLOAT
+        if state == MISSING:
+            return False, None
+        if state == NULL:
+            return True, None
+        value = self.values[row]
+        if self.kind == 'float':
+            return True, int(value) if state == INT else value
+        if self.kind == 'int':
+            return True, value
+        return True, self._entry(value)
+
+    def _entry(self, code):
+        if code not in self._decoded:
+            raw = bytes(self.strings[self.offsets[code]:self.offsets[code + 1]]).decode('utf-8')
+            self._decoded[code] = raw if self.kind == 'str' else json.loads(raw)
+        return self._decoded[code]
+
+
+class ColumnarCollection(Sequence):
+    """Sequence of records backed by snapshot columns; rows decode on access"""
+
+    def __init__(self, buffer, spec):
+        self.rows = spec['rows']
+        self.fields = list(spec['columns'])
+        self._columns = {field: Column(buffer, column) for field, column in spec['columns'].items()}
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.rows))]
+        if index < 0:
+            index += self.rows
+        if not 0 <= index < self.rows:
+            raise IndexError('record index out of range')
+        record = {}
+        for field, column in self._columns.items():
+            present, value = column.get(index)
+            if present:
+                record[field] = value
+        return record
+
+    def column(self, field):
+        """Zero-copy memoryview of a numeric column (codes for string columns)"""
+        return self._columns[field].values
+
+
+class SnapshotReader:
+    """Memory-maps a snapshot file and exposes its collections lazily"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a snapshot file')
+        (header_size,) = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(self._mmap[start:start + header_size])
+        if self.header.get('version') != FORMAT_VERSION:
+            raise ValueError(f'Unsupported snapshot version {self.header.get("version")}')
+        if self.header.get('byteorder') != sys.byteorder:
+            raise ValueError('Snapshot byte order does not match this platform')
+        self._buffer = memoryview(self._mmap)
+        self._collections = {}
+
+    def collection_names(self):
+        return list(self.header['collections'])
+
+    def collection(self, name):
+        if name not in self._collections:
+            self._collections[name] = ColumnarCollection(self._buffer, self.header['collections'][name])
+        return self._collections[name]
+
+    def as_data(self, names):
+        """Return a data dict with a lazy collection for each name"""
+        return {
+            name: self.collection(name) if name in self.header['collections'] else []
+            for name in names
+        }
+
+
+class _StreamReader:
+    """Incremental JSON tokenizer over a text file read in fixed-size chunks"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+        return bool(chunk)
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise json.JSONDecodeError('Unexpected end of data', self.buf, self.pos)
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f'Expected {char!r}', self.buf, self.pos)
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number ending exactly at the buffer edge may be truncated
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_json_collections(path, chunk_size=1 << 16):
+    """Stream (collection name, record) pairs from a JSON file.
+
+    The file is tokenized in chunks so the raw text and the parsed records are
+    never held in memory together. Top-level values that are not arrays are
+    skipped.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _StreamReader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            name = reader.value()
+            reader.expect(':')
+            if reader.peek() == '[':
+                reader.expect('[')
+                if reader.peek() != ']':
+                    while True:
+                        yield name, reader.value()
+                        if reader.peek() == ',':
+                            reader.expect(',')
+                            continue
+                        break
+                reader.expect(']')
+            else:
+                reader.value()
+            if reader.peek() == ',':
+                reader.expect(',')
+                continue
+            reader.expect('}')
+            return
+
+
+def load_json_streaming(path, names):
+    """Build a data dict from a JSON file using the streaming parser"""
+    data = {name: [] for name in names}
+    for name, record in iter_json_collections(path):
+        data.setdefault(name, []).append(record)
+    return data
+
+
+def convert_json(json_path, snapshot_path):
+    """Convert a JSON data dump to the columnar snapshot format"""
+    # Records of one collection arrive contiguously, so each group is streamed
+    # straight into its column builders
+    groups = groupby(iter_json_collections(json_path), key=itemgetter(0))
+    write_snapshot(
+        ((name, (record for _, record in group)) for name, group in groups),
+        snapshot_path
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert a JSON data dump to a columnar snapshot')
+    parser.add_argument('source', help='JSON file in the mock_data.json shape')
+    parser.add_argument('target', help='Snapshot file to write')
+    args = parser.parse_args()
+    try:
+        convert_json(args.source, args.target)
+    except ValueError as e:
+        sys.exit(f'Cannot convert {args.source}: {e}')
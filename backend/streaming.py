@@ -0,0 +1,140 @@
+import asyncio
+import json
+import threading
+from config import config
+from aggregates import aggregates
+from insights import team_insights
+from models import get_productivity_metrics, get_time_distribution
+
+
+class MetricBroadcaster:
+    """Pushes compact metric diffs to Server-Sent Events subscribers.
+
+    Metrics are computed once per team per snapshot change (only for teams
+    that have subscribers) on the thread that changed the snapshot, then
+    handed to the event loop, which drops the diff into each subscriber's
+    bounded queue. Idle connections just await their queue, so there is no
+    per-connection polling. A subscriber that falls behind has its queue
+    replaced by a single full snapshot event.
+    """
+
+    def __init__(self, aggregates, insights, queue_size=None, max_connections=None):
+        self.aggregates = aggregates
+        self.insights = insights
+        self.queue_size = queue_size or config.SSE_QUEUE_SIZE
+        self.max_connections = max_connections or config.SSE_MAX_CONNECTIONS
+        self.subscribers = {}
+        self.connections = 0
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def attach(self, loop):
+        """Bind to the event loop that owns the subscriber queues"""
+        self._loop = loop
+
+    def metrics(self, team):
+        return {
+            'overview': get_productivity_metrics(self.aggregates, team),
+            'time_distribution': get_time_distribution(self.aggregates, 'week', team),
+            'insights': self.insights(team)
+        }
+
+    @staticmethod
+    def diff(old, new):
+        """Changed keys per section; non-dict sections are sent whole"""
+        changes = {}
+        for section, value in new.items():
+            previous = old.get(section)
+            if value == previous:
+                continue
+            if isinstance(value, dict) and isinstance(previous, dict):
+                changes[section] = {k: v for k, v in value.items() if previous.get(k) != v}
+            else:
+                changes[section] = value
+        return changes
+
+    def on_change(self, store, change=None):
+        """SnapshotStore listener; must be subscribed after aggregates, insights and anomalies"""
+        if self._loop is None:
+            return
+        with self._lock:
+            teams = list(self.subscribers)
+        if change is not None:
+            touched = {None}
+            for record in (change['old'], change['new']):
+                if record is not None:
+                    touched.add(record.get('team'))
+            teams = [team for team in teams if team in touched]
+
+        for team in teams:
+            metrics = self.metrics(team)
+            previous = self._latest.get(team, {})
+            changes = self.diff(previous, metrics)
+            self._latest[team] = metrics
+            if changes:
+                message = {'version': store.pending_version, 'changes': changes}
+                self._loop.call_soon_threadsafe(self._fan_out, team, message)
+
+    def _fan_out(self, team, message):
+        for queue in list(self.subscribers.get(team, ())):
+            if queue.full():
+                # Diffs are only meaningful in sequence; resync with a full snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(('snapshot', self._snapshot_message(team)))
+            else:
+                queue.put_nowait(('diff', message))
+
+    def _snapshot_message(self, team):
+        if team not in self._latest:
+            self._latest[team] = self.metrics(team)
+        return {'changes': self._latest[team]}
+
+    def full(self):
+        return self.connections >= self.max_connections
+
+    def subscribe(self, team):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self.subscribers.setdefault(team, set()).add(queue)
+        self.connections += 1
+        return queue
+
+    def unsubscribe(self, team, queue):
+        with self._lock:
+            queues = self.subscribers.get(team)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self.subscribers[team]
+                    self._latest.pop(team, None)
+        self.connections -= 1
+
+    async def events(self, team):
+        """Async generator of SSE frames for one subscriber.
+
+        The subscriber is registered on first iteration, inside the try, so a
+        client that disconnects before the stream starts is never counted.
+        """
+        queue = None
+        try:
+            queue = self.subscribe(team)
+            yield self._format('snapshot', self._snapshot_message(team))
+            while True:
+                try:
+                    event, message = await asyncio.wait_for(queue.get(), timeout=config.SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield self._format(event, message)
+        finally:
+            if queue is not None:
+                self.unsubscribe(team, queue)
+
+    @staticmethod
+    def _format(event, message):
+        return f'event: {event}\ndata: {json.dumps(message, separators=(",", ":"))}\n\n'
+
+
+broadcaster = MetricBroadcaster(aggregates, team_insights)
@@ -0,0 +1,76 @@
+import re
+import threading
+from cachetools import LRUCache
+from config import config
+
+
+def normalize_team(team):
+    """Key a team name is matched by: lowercase with spaces removed"""
+    return team.lower().replace(' ', '')
+
+
+class TeamResolver:
+    """Resolves labels and component names to configured teams.
+
+    A label belongs to a team when the team's normalized name occurs in the
+    lowercased label. When several teams match, the one listed first in the
+    configuration wins; across a label list, the first label that matches
+    decides. Results are memoized per label and per label set.
+    """
+
+    def __init__(self, teams, cache_size=65536):
+        self.teams = [team for team in teams if normalize_team(team)]
+        self.default_team = teams[0] if teams else 'Default Team'
+        self._order = {}
+        for index, team in enumerate(self.teams):
+            self._order.setdefault(normalize_team(team), (index, team))
+        # Lookahead alternation in config order reports, at every position, the
+        # earliest-configured team whose key starts there (overlaps included)
+        alternatives = '|'.join(re.escape(key) for key in self._order)
+        self._pattern = re.compile(f'(?=({alternatives}))') if alternatives else None
+        self._label_cache = LRUCache(maxsize=cache_size)
+        self._set_cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+
+    def match(self, label):
+        """Return the team a single label refers to, or None"""
+        with self._lock:
+            if label in self._label_cache:
+                return self._label_cache[label]
+        team = self._match_uncached(label)
+        with self._lock:
+            self._label_cache[label] = team
+        return team
+
+    def _match_uncached(self, label):
+        if self._pattern is None or not label:
+            return None
+        text = label.lower()
+        best = None
+        for found in self._pattern.finditer(text):
+            candidate = self._order[found.group(1)]
+            if best is None or candidate[0] < best[0]:
+                best = candidate
+                if best[0] == 0:
+                    break
+        return best[1] if best else None
+
+    def resolve(self, labels):
+        """Return the team for the first matching label, or None"""
+        if not labels:
+            return None
+        key = tuple(labels)
+        with self._lock:
+            if key in self._set_cache:
+                return self._set_cache[key]
+        team = None
+        for label in key:
+            team = self.match(label)
+            if team:
+                break
+        with self._lock:
+            self._set_cache[key] = team
+        return team
+
+
+team_resolver = TeamResolver(config.TEAMS)
@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from aggregates import ALL_TEAMS
+from config import config
+from snapshot import store
+
+
+class Warmup:
+    """Precomputed dashboard responses for every configured team and for all teams.
+
+    After each snapshot change the registered responses are rebuilt on a
+    worker pool in the background. A cached response is only served while it
+    belongs to the current snapshot version (and day, since trends are
+    relative to today); anything else is computed on the request. Changes
+    arriving during a warm-up trigger one more round once it finishes.
+    """
+
+    def __init__(self, store, workers=None, teams=None):
+        self.store = store
+        self.workers = workers or config.WARMUP_WORKERS
+        self.teams = teams if teams is not None else config.TEAMS
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='warmup')
+        self.endpoints = {}
+        self.responses = {}
+        self.ready = threading.Event()
+        self.last_run = None
+        self._running = False
+        self._pending = False
+        self._lock = threading.Lock()
+
+    def register(self, name, compute):
+        """Warm `compute(team)` for every team under `name`"""
+        self.endpoints[name] = compute
+        return compute
+
+    def listener(self, store, change=None):
+        """Snapshot listener; schedules a warm-up without blocking the publisher"""
+        with self._lock:
+            if self._running:
+                self._pending = True
+                return
+            self._running = True
+        threading.Thread(target=self._run, name='warmup', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.warm()
+            except Exception:
+                pass
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                self._pending = False
+
+    def _compute(self, name, team, version, day):
+        value = self.endpoints[name](team)
+        self.responses[(name, team)] = (version, day, value)
+
+    def warm(self):
+        """Compute every registered response for every team and wait for them"""
+        started = time.time()
+        version = self.store.current_version()
+        day = date.today().isoformat()
+        futures = [
+            self.executor.submit(self._compute, name, team, version, day)
+            for name in self.endpoints
+            for team in [ALL_TEAMS] + self.teams
+        ]
+        errors = [str(future.exception()) for future in futures if future.exception() is not None]
+        self.last_run = {
+            'version': version,
+            'started_at': started,
+            'duration': round(time.time() - started, 3),
+            'responses': len(futures) - len(errors),
+            'errors': errors[:10]
+        }
+        if not errors:
+            self.ready.set()
+
+    def get(self, name, team=None):
+        """The warmed response if it is current, else a freshly computed one"""
+        team = team or ALL_TEAMS
+        entry = self.responses.get((name, team))
+        if entry is not None and entry[0] == self.store.version and entry[1] == date.today().isoformat():
+            return entry[2]
+        return self.endpoints[name](team)
+
+    def status(self):
+        return {
+            'ready': self.ready.is_set(),
+            'running': self._running,
+            'workers': self.workers,
+            'teams': len(self.teams) + 1,
+            'endpoints': sorted(self.endpoints),
+            'last_run': self.last_run
+        }
+
+
+warmup = Warmup(store)
@@ -0,0 +1,45 @@
+from config import config
+from jira_integration import jira_integration, JIRA_COLLECTIONS
+from gitlab_integration import gitlab_integration, mr_record_id
+
+
+def jira_event_changes(payload):
+    """Translate a Jira issue webhook into record changes.
+
+    An issue can belong to several collections, and an update can move it out
+    of one, so every Jira collection gets either an upsert or a delete.
+    """
+    raw = payload.get('issue')
+    if not raw or 'key' not in raw:
+        return []
+    key = raw['key']
+
+    if payload.get('webhookEvent') == 'jira:issue_deleted':
+        return [('delete', name, key) for name in JIRA_COLLECTIONS]
+
+    issue = jira_integration.issue_from_raw(raw)
+    project = getattr(issue.fields, 'project', None)
+    # Custom JQL scopes cannot be evaluated locally, so they accept every project
+    if config.JIRA_PROJECT_KEYS and not config.JIRA_SCOPES and project and getattr(project, 'key', None) not in config.JIRA_PROJECT_KEYS:
+        return []
+
+    records = jira_integration.normalize_issue(issue)
+    return [
+        ('upsert', name, records[name]) if name in records else ('delete', name, key)
+        for name in JIRA_COLLECTIONS
+    ]
+
+
+def gitlab_event_changes(payload, store):
+    """Translate a GitLab merge request webhook into record changes"""
+    if payload.get('object_kind') != 'merge_request':
+        return []
+
+    project_id = str((payload.get('project') or {}).get('id', ''))
+    project_ids = gitlab_integration.project_ids()
+    if project_ids and project_id not in project_ids:
+        return []
+
+    attrs = payload['object_attributes']
+    existing = store.get('pull_requests', mr_record_id(attrs.get('target_project_id') or project_id, attrs['iid']))
+    return [('upsert', 'pull_requests', gitlab_integration.normalize_mr_event(payload, existing))]
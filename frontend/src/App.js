@@ -10,12 +10,23 @@ import axios from 'axios';
 
 const API_URL = 'http://localhost:5001/api';
 
+// Apply a metrics diff from the stream: object sections merge key by key, others are replaced
+const mergeMetrics = (previous, changes) => {
+  const merged = { ...previous };
+  Object.entries(changes).forEach(([section, value]) => {
+    const isObject = value && typeof value === 'object' && !Array.isArray(value);
+    merged[section] = isObject ? { ...(previous || {})[section], ...value } : value;
+  });
+  return merged;
+};
+
 function App() {
   const [activeTab, setActiveTab] = useState('dashboard');
   const [overview, setOverview] = useState(null);
   const [loading, setLoading] = useState(true);
   const [teams, setTeams] = useState([]);
   const [selectedTeam, setSelectedTeam] = useState('');
+  const [liveMetrics, setLiveMetrics] = useState(null);
 
   useEffect(() => {
     fetchTeams();
@@ -25,6 +36,25 @@ function App() {
     fetchOverview();
   }, [selectedTeam]);
 
+  useEffect(() => {
+    const params = selectedTeam ? `?team=${encodeURIComponent(selectedTeam)}` : '';
+    const source = new EventSource(`${API_URL}/stream${params}`);
+    source.addEventListener('snapshot', (event) => {
+      setLiveMetrics(JSON.parse(event.data).changes);
+    });
+    source.addEventListener('diff', (event) => {
+      const { changes } = JSON.parse(event.data);
+      setLiveMetrics((previous) => mergeMetrics(previous, changes));
+    });
+    return () => source.close();
+  }, [selectedTeam]);
+
+  useEffect(() => {
+    if (liveMetrics && liveMetrics.overview) {
+      setOverview(liveMetrics.overview);
+    }
+  }, [liveMetrics]);
+
   const fetchTeams = async () => {
     try {
       const response = await axios.get(`${API_URL}/teams`);
@@ -115,10 +145,10 @@ function App() {
       </nav>
 
       <main className="content">
-        {activeTab === 'dashboard' && <Dashboard overview={overview} selectedTeam={selectedTeam} />}
+        {activeTab === 'dashboard' && <Dashboard overview={overview} selectedTeam={selectedTeam} liveTimeDistribution={liveMetrics && liveMetrics.time_distribution} />}
         {activeTab === 'time' && <TimeDistribution selectedTeam={selectedTeam} />}
         {activeTab === 'team' && <TeamPerformance selectedTeam={selectedTeam} />}
-        {activeTab === 'insights' && <Insights selectedTeam={selectedTeam} />}
+        {activeTab === 'insights' && <Insights selectedTeam={selectedTeam} liveInsights={liveMetrics && liveMetrics.insights} />}
         {activeTab === 'stories' && <UserStories selectedTeam={selectedTeam} />}
         {activeTab === 'prs' && <PullRequests selectedTeam={selectedTeam} />}
       </main>
@@ -7,13 +7,19 @@ ChartJS.register(ArcElement, Tooltip, Legend);
 
 const API_URL = 'http://localhost:5001/api';
 
-function Dashboard({ overview, selectedTeam }) {
+function Dashboard({ overview, selectedTeam, liveTimeDistribution }) {
   const [timeDistribution, setTimeDistribution] = useState(null);
 
   useEffect(() => {
     fetchTimeDistribution();
   }, [selectedTeam]);
 
+  useEffect(() => {
+    if (liveTimeDistribution) {
+      setTimeDistribution(liveTimeDistribution);
+    }
+  }, [liveTimeDistribution]);
+
   const fetchTimeDistribution = async () => {
     try {
       const params = selectedTeam ? { team: selectedTeam } : {};
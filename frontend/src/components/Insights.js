@@ -3,7 +3,7 @@ import axios from 'axios';
 
 const API_URL = 'http://localhost:5001/api';
 
-function Insights({ selectedTeam }) {
+function Insights({ selectedTeam, liveInsights }) {
   const [insights, setInsights] = useState([]);
   const [loading, setLoading] = useState(true);
 
@@ -11,6 +11,13 @@ function Insights({ selectedTeam }) {
     fetchInsights();
   }, [selectedTeam]);
 
+  useEffect(() => {
+    if (liveInsights) {
+      setInsights(liveInsights);
+      setLoading(false);
+    }
+  }, [liveInsights]);
+
   const fetchInsights = async () => {
     try {
       const params = selectedTeam ? { team: selectedTeam } : {};